@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# bench_parsers.py
+# Offline regression check + benchmark for the extractors against a fixture corpus.
+#
+#   python bench_parsers.py                      # all fixtures/*.html, all backends
+#   python bench_parsers.py --repeat 50 --page wallet
+#   python bench_parsers.py --update-expected    # after an intended parser change
+#
+# Fixtures are matched to an extractor by filename prefix (trending_, traders_,
+# wallet_, token_info_). The bundled ones are synthetic: hand-built pages that
+# copy the live markup's tags, class names and nesting with made-up tokens and
+# wallets, so they pin parser behaviour but won't notice a site redesign. Live
+# pages can be added to the corpus by running a scraper with FIXTURE_DUMP_DIR
+# set. Every fixture is parsed with every backend; the html.parser/full result
+# must match fixtures/expected/<name>.json and the faster backends must match
+# html.parser, otherwise the exit code is 1.
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+import extractors
+from extractors import parse_trending_rows, parse_trader_wallets, parse_wallet_stats, parse_token_info
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (label, bs4 tree builder, partial parsing)
+CONFIGS = [
+    ("html.parser/full", "html.parser", False),
+    ("lxml/full", "lxml", False),
+    ("lxml/partial", "lxml", True),
+]
+
+def parse_number(value_str):
+    # same as trader-extractor-redis.parse_number (hyphenated scripts can't be imported)
+    if not value_str:
+        return None
+    value_str = value_str.replace(",", "").strip().replace("$", "").replace("%", "")
+    multiplier = 1.0
+    for suffix, mult in (("K", 1e3), ("M", 1e6), ("B", 1e9)):
+        if value_str.endswith(suffix):
+            multiplier, value_str = mult, value_str[:-1]
+            break
+    try:
+        return float(value_str) * multiplier
+    except ValueError:
+        return None
+
+PAGES = {
+    "trending": lambda html, backend: parse_trending_rows(html, 100, backend),
+    "traders": lambda html, backend: parse_trader_wallets(html, backend),
+    "wallet": lambda html, backend: parse_wallet_stats(html, parse_number, backend),
+    "token_info": lambda html, backend: parse_token_info(html, "https://dexscreener.com/solana/fixture", backend),
+}
+
+def page_type(path: str) -> str:
+    name = os.path.basename(path)
+    for page in sorted(PAGES, key=len, reverse=True):
+        if name.startswith(page + "_"):
+            return page
+    return ""
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+def measure(parse, html: str, backend: str, repeat: int) -> Dict:
+    # latency without tracemalloc overhead
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html, backend)
+        samples.append(time.perf_counter() - start)
+    # peak Python heap for one parse
+    tracemalloc.start()
+    parse(html, backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "pages_per_sec": len(samples) / sum(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+def expected_path(fixture: str) -> str:
+    name = os.path.splitext(os.path.basename(fixture))[0]
+    return os.path.join(os.path.dirname(fixture), "expected", name + ".json")
+
+def run(fixtures: List[str], repeat: int, update_expected: bool) -> int:
+    failures = 0
+    print(f"{'fixture':<30} {'backend':<17} {'pages/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak KB':>9}  check")
+    for path in fixtures:
+        page = page_type(path)
+        parse = PAGES[page]
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+
+        reference = None
+        for label, backend, partial in CONFIGS:
+            extractors.PARTIAL_PARSE = partial
+            result = json.loads(json.dumps(parse(html, backend)))
+            if reference is None:
+                reference = result
+                exp_path = expected_path(path)
+                if update_expected:
+                    os.makedirs(os.path.dirname(exp_path), exist_ok=True)
+                    with open(exp_path, "w", encoding="utf-8") as f:
+                        json.dump(result, f, indent=2, sort_keys=True)
+                    check = "written"
+                elif os.path.exists(exp_path):
+                    with open(exp_path, encoding="utf-8") as f:
+                        check = "ok" if json.load(f) == result else "EXPECTED MISMATCH"
+                else:
+                    check = "no expected"
+            else:
+                check = "ok" if result == reference else "BACKEND MISMATCH"
+            if "MISMATCH" in check:
+                failures += 1
+
+            m = measure(parse, html, backend, repeat)
+            print(f"{os.path.basename(path):<30} {label:<17} {m['pages_per_sec']:9.1f} "
+                  f"{m['p50_ms']:8.2f} {m['p99_ms']:8.2f} {m['peak_kb']:9.0f}  {check}")
+    return failures
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("fixtures", nargs="*", help="HTML files (default: fixtures/*.html)")
+    ap.add_argument("--page", choices=sorted(PAGES), help="only run one extractor")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--update-expected", action="store_true")
+    args = ap.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    paths = [p for p in paths if page_type(p) and (not args.page or page_type(p) == args.page)]
+    if not paths:
+        print("No fixtures found")
+        sys.exit(1)
+    failures = run(paths, max(1, args.repeat), args.update_expected)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,405 @@
+# browser_pool.py
+# Pool of long-lived, pre-warmed SeleniumBase (uc + CDP) browsers that are
+# leased to scrape jobs instead of starting a fresh Chrome for every page.
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from seleniumbase import SB
+from rate_limit import DomainRateLimiter
+from session_store import ClearanceStore, challenge_present, site_of
+
+# ----------------------------
+# Settings
+# ----------------------------
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))          # recycle after N page loads
+MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))       # recycle above this RSS (0 = off)
+WARM_URL = os.getenv("BROWSER_WARM_URL", "https://dexscreener.com")
+LEASE_TIMEOUT = float(os.getenv("BROWSER_LEASE_TIMEOUT", "600"))
+DEBUG = True
+
+def dprint(msg: str):
+    if DEBUG:
+        t = threading.current_thread()
+        print(f"{t.ident}::pool:: {msg}")
+
+def _proc_children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(c) for c in f.read().split()]
+    except OSError:
+        return []
+
+def _proc_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def process_tree_rss_mb(pid: int) -> float:
+    """RSS of a process and all its descendants (Linux /proc only)."""
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        total += _proc_rss_kb(p)
+        stack.extend(_proc_children(p))
+    return total / 1024.0
+
+class PooledBrowser:
+    """One long-lived SB session. Use `open()` so page loads are counted."""
+
+    def __init__(self, headless: bool, rate_limiter: Optional[DomainRateLimiter] = None,
+                 sessions: Optional[ClearanceStore] = None, readiness=None):
+        self.rate_limiter = rate_limiter
+        self.sessions = sessions
+        self.readiness = readiness
+        self._session_loaded: Dict[str, float] = {}   # site -> saved_at of the state in this browser
+        self._ctx = SB(uc=True, test=True, locale_code="en", headless=headless)
+        self.sb = self._ctx.__enter__()
+        self.created_at = time.time()
+        self.pages = 0
+        self.leases = 0
+        self.cdp_active = False
+
+    def _load_session(self, url: str):
+        """Put the site's saved clearance cookies into this browser before navigating there."""
+        site = site_of(url)
+        try:
+            if not self.cdp_active:
+                if not self.sessions.get(site):
+                    return
+                # cookies can only be set once the CDP session exists
+                self.sb.activate_cdp_mode("about:blank")
+                self.cdp_active = True
+            saved_at = self.sessions.apply(self.sb.cdp, url, newer_than=self._session_loaded.get(site))
+        except Exception as e:
+            dprint(f"Could not load saved session for {site}: {e}")
+            return
+        if saved_at:
+            self._session_loaded[site] = saved_at
+
+    def _session_challenged(self, url: str):
+        try:
+            if self.sessions and challenge_present(self.sb.cdp):
+                self.sessions.challenged(url)
+        except Exception as e:
+            dprint(f"Could not record challenge for {url}: {e}")
+
+    def _session_cleared(self, url: str):
+        try:
+            if self.sessions:
+                self.sessions.save_if_missing(self.sb.cdp, url)
+        except Exception as e:
+            dprint(f"Could not save session for {url}: {e}")
+
+    def open(self, url: str):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(url)
+        if self.sessions:
+            self._load_session(url)
+        # first navigation switches the session into CDP mode, later ones reuse it
+        if not self.cdp_active:
+            self.sb.activate_cdp_mode(url)
+            self.cdp_active = True
+        else:
+            self.sb.open(url)
+        self.pages += 1
+
+    def _open_tab(self, url: str):
+        """Load `url` in a new background tab (CDP mode) and return the tab."""
+        if self.rate_limiter:
+            self.rate_limiter.acquire(url)
+        if self.sessions:
+            self._load_session(url)
+        cdp = self.sb.cdp
+        before = {id(t) for t in cdp.get_tabs()}
+        cdp.open_new_tab(url=url, switch_to=False)
+        self.pages += 1
+        new = [t for t in cdp.get_tabs() if id(t) not in before]
+        return new[-1] if new else cdp.get_tabs()[-1]
+
+    def _close_tab(self, tab):
+        try:
+            self.sb.cdp.switch_to_tab(tab)
+            self.sb.cdp.close_active_tab()
+        except Exception as e:
+            dprint(f"Error closing tab: {e}")
+
+    def fan_out(self, urls: List[str], ready_selector: str, on_ready: Callable[[str, str], Any],
+                width: int = 4, timeout: float = 50.0, captcha_after: float = 3.0,
+                poll: float = 0.25,
+                on_loaded: Optional[Callable[[str, float], Any]] = None) -> Dict[str, Any]:
+        """
+        Load `urls` in up to `width` tabs of this session at once. Open tabs
+        are polled round-robin; as soon as one shows `ready_selector`,
+        `on_ready(url, html)` runs, the tab is closed and the next URL takes
+        its slot. Returns {url: on_ready result or the exception}; a tab not
+        ready within `timeout` seconds maps to TimeoutError. `on_loaded(url,
+        seconds)` gets each ready tab's load time. Challenges and clearances
+        go to the session store like in Readiness.wait(). The tab that was
+        active before stays active afterwards.
+        """
+        if not self.cdp_active:
+            self.open("about:blank")
+        cdp = self.sb.cdp
+        main = cdp.get_active_tab()
+        pending = list(urls)
+        open_tabs = []   # [url, tab, opened_at, captcha_clicked]
+        results: Dict[str, Any] = {}
+        try:
+            while pending or open_tabs:
+                while pending and len(open_tabs) < max(1, width):
+                    url = pending.pop(0)
+                    try:
+                        open_tabs.append([url, self._open_tab(url), time.monotonic(), False])
+                    except Exception as e:
+                        results[url] = e
+                for entry in list(open_tabs):
+                    url, tab, opened_at, captcha_clicked = entry
+                    try:
+                        cdp.switch_to_tab(tab)
+                        if cdp.is_element_visible(ready_selector):
+                            if on_loaded:
+                                on_loaded(url, time.monotonic() - opened_at)
+                            self._session_cleared(url)
+                            try:
+                                results[url] = on_ready(url, cdp.get_page_source())
+                            except Exception as e:
+                                results[url] = e
+                        elif time.monotonic() - opened_at > timeout:
+                            results[url] = TimeoutError(f"{ready_selector} not visible after {timeout}s")
+                        else:
+                            if not captcha_clicked and time.monotonic() - opened_at > captcha_after:
+                                # challenge pages need the tab in front for the GUI click
+                                entry[3] = True
+                                self._session_challenged(url)
+                                try: self.sb.uc_gui_click_captcha()
+                                except Exception as e: dprint(f"Captcha not present/ignored in tab: {e}")
+                            continue
+                    except Exception as e:
+                        results[url] = e
+                    open_tabs.remove(entry)
+                    self._close_tab(tab)
+                if open_tabs:
+                    time.sleep(poll)
+        finally:
+            for entry in open_tabs:
+                self._close_tab(entry[1])
+            try:
+                cdp.switch_to_tab(main)
+            except Exception as e:
+                dprint(f"Error switching back to the main tab: {e}")
+        return results
+
+    def warm(self, url: str):
+        self.open(url)
+        if self.readiness is not None:
+            # polls the trending table (clicking a challenge once) instead of a fixed sleep
+            self.readiness.wait(self.sb, "warm", selector=self.readiness.selector("trending"))
+            return
+        self.sb.sleep(4)
+        self._session_challenged(url)
+        try: self.sb.uc_gui_click_captcha()
+        except Exception as e: dprint(f"Captcha not present/ignored while warming: {e}")
+
+    def browser_pid(self) -> Optional[int]:
+        driver = getattr(self.sb, "driver", None)
+        pid = getattr(driver, "browser_pid", None)
+        if pid:
+            return pid
+        service = getattr(driver, "service", None)
+        process = getattr(service, "process", None)
+        return getattr(process, "pid", None)
+
+    def rss_mb(self) -> float:
+        pid = self.browser_pid()
+        return process_tree_rss_mb(pid) if pid else 0.0
+
+    def is_healthy(self) -> bool:
+        try:
+            self.sb.get_current_url()
+            return True
+        except Exception as e:
+            dprint(f"Health check failed: {e}")
+            return False
+
+    def close(self):
+        try:
+            self._ctx.__exit__(None, None, None)
+        except Exception as e:
+            dprint(f"Error closing browser: {e}")
+
+class BrowserPool:
+    """
+    Bounded pool of warm browsers. `lease()` hands out an idle browser (or
+    starts a new one while below `size`) and blocks otherwise. Browsers are
+    health-checked before each lease and recycled after `max_pages` page
+    loads or once their process tree grows past `max_rss_mb`.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, headless: bool = True,
+                 max_pages: int = MAX_PAGES, max_rss_mb: int = MAX_RSS_MB,
+                 warm_url: Optional[str] = WARM_URL,
+                 rate_limiter: Optional[DomainRateLimiter] = None,
+                 sessions: Optional[ClearanceStore] = None, readiness=None):
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.warm_url = warm_url
+        # one limiter for every browser in the pool so per-domain rates hold across workers
+        self.rate_limiter = rate_limiter or DomainRateLimiter()
+        # saved Cloudflare clearance shared by every browser (None = solve per browser)
+        self.sessions = sessions
+        # readiness.Readiness for warm-up waits (None = the fixed sleep)
+        self.readiness = readiness
+        self._cond = threading.Condition()
+        self._idle: List[PooledBrowser] = []
+        self._total = 0
+        self._closed = False
+        # metrics
+        self._created = 0
+        self._recycled = 0
+        self._unhealthy = 0
+        self._leases = 0
+        self._lease_wait_total = 0.0
+        self._lease_wait_max = 0.0
+
+    def _new_browser(self) -> PooledBrowser:
+        browser = PooledBrowser(self.headless, self.rate_limiter, self.sessions, self.readiness)
+        if self.warm_url:
+            try:
+                browser.warm(self.warm_url)
+            except Exception as e:
+                dprint(f"Warm-up navigation failed: {e}")
+        with self._cond:
+            self._created += 1
+        dprint(f"Started browser (total={self._total}/{self.size})")
+        return browser
+
+    def _needs_recycle(self, browser: PooledBrowser) -> bool:
+        if self.max_pages and browser.pages >= self.max_pages:
+            dprint(f"Recycling browser after {browser.pages} pages")
+            return True
+        if self.max_rss_mb:
+            rss = browser.rss_mb()
+            if rss >= self.max_rss_mb:
+                dprint(f"Recycling browser at {rss:.0f} MB RSS")
+                return True
+        return False
+
+    def _discard(self, browser: Optional[PooledBrowser]):
+        if browser is not None:
+            browser.close()
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def warm(self):
+        """Start browsers until the pool is full so the first jobs don't pay the cold start."""
+        while True:
+            with self._cond:
+                if self._closed or self._total >= self.size:
+                    return
+                self._total += 1
+            try:
+                browser = self._new_browser()
+            except Exception:
+                self._discard(None)
+                raise
+            self._release(browser)
+
+    def _acquire(self, timeout: Optional[float]) -> PooledBrowser:
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
+                if self._idle:
+                    browser = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    browser = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No browser available after {timeout}s")
+                self._cond.wait(remaining)
+
+        if browser is not None and not browser.is_healthy():
+            with self._cond:
+                self._unhealthy += 1
+            browser.close()
+            browser = None
+        if browser is None:
+            try:
+                browser = self._new_browser()
+            except Exception:
+                self._discard(None)
+                raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._leases += 1
+            self._lease_wait_total += waited
+            self._lease_wait_max = max(self._lease_wait_max, waited)
+        browser.leases += 1
+        return browser
+
+    def _release(self, browser: PooledBrowser):
+        if self._closed or self._needs_recycle(browser):
+            with self._cond:
+                self._recycled += 1
+            self._discard(browser)
+            return
+        with self._cond:
+            self._idle.append(browser)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = LEASE_TIMEOUT):
+        """Borrow a browser for the duration of the `with` block."""
+        browser = self._acquire(timeout)
+        try:
+            yield browser
+        except Exception:
+            # the page state is unknown after a failed job; only keep it if it still responds
+            if not browser.is_healthy():
+                with self._cond:
+                    self._unhealthy += 1
+                self._discard(browser)
+                raise
+            self._release(browser)
+            raise
+        self._release(browser)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "total": self._total,
+                "idle": len(self._idle),
+                "leased": self._total - len(self._idle),
+                "created": self._created,
+                "recycled": self._recycled,
+                "unhealthy": self._unhealthy,
+                "leases": self._leases,
+                "lease_wait_avg_s": round(self._lease_wait_total / self._leases, 3) if self._leases else 0.0,
+                "lease_wait_max_s": round(self._lease_wait_max, 3),
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for browser in idle:
+            self._discard(browser)
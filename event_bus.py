@@ -0,0 +1,129 @@
+# event_bus.py
+# Durable token_changed events on a Redis Stream with consumer groups.
+# Producers XADD; each consumer group gets every event once, spread over its
+# consumers, and an event stays pending until the consumer acks it.
+import os
+import json
+import time
+import socket
+from typing import Dict, List, Optional, Tuple
+import redis
+
+K_STREAM = os.getenv("EVENT_STREAM", "stream:token_changed")
+STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))   # approximate trim
+# zset event_id -> processed at (unix ts), one per stream and group
+K_DEDUPE_TEMPLATE = "{stream}:{group}:processed"
+DEDUPE_TTL = int(os.getenv("EVENT_DEDUPE_TTL", "86400"))
+CLAIM_IDLE_MS = int(os.getenv("EVENT_CLAIM_IDLE_MS", "600000"))    # reclaim after 10 min
+CLAIM_PAGES = int(os.getenv("EVENT_CLAIM_PAGES", "10"))            # XAUTOCLAIM calls per read() at most
+
+def publish_events(r, payloads: List[Dict], stream: str = K_STREAM) -> List[str]:
+    """XADD a batch of events in one pipelined round-trip; returns the entry ids."""
+    if not payloads:
+        return []
+    pipe = r.pipeline(transaction=False)
+    for payload in payloads:
+        pipe.xadd(stream, {"data": json.dumps(payload)}, maxlen=STREAM_MAXLEN, approximate=True)
+    return pipe.execute()
+
+class StreamConsumer:
+    """
+    One consumer in a consumer group. `read()` first returns this consumer's
+    own unacked entries (after a restart), then entries other consumers left
+    pending for longer than `claim_idle_ms` (crashed workers), then new ones.
+    A claim sweep walks the whole pending list with the XAUTOCLAIM cursor
+    across consecutive reads, so a dead consumer's backlog drains at read
+    speed rather than one page per sweep interval.
+    Processed event_ids are remembered per stream and group for `dedupe_ttl`
+    seconds so a redelivered event is acked without being processed twice.
+    """
+
+    def __init__(self, r, group: str, consumer: Optional[str] = None, stream: str = K_STREAM,
+                 claim_idle_ms: int = CLAIM_IDLE_MS, dedupe_ttl: int = DEDUPE_TTL,
+                 claim_pages: int = CLAIM_PAGES):
+        self.r = r
+        self.group = group
+        # stable across restarts so the consumer picks its own pending entries back up
+        self.consumer = consumer or os.getenv("EVENT_CONSUMER") or socket.gethostname()
+        self.stream = stream
+        self.claim_idle_ms = claim_idle_ms
+        self.dedupe_ttl = dedupe_ttl
+        self.claim_pages = max(1, claim_pages)
+        self.k_dedupe = K_DEDUPE_TEMPLATE.format(stream=stream, group=group)
+        self._backlog_id = "0"    # None once our own pending entries were re-read
+        self._claim_cursor: Optional[str] = None   # XAUTOCLAIM position while a sweep runs
+        self._last_claim = 0.0
+
+    def ensure_group(self) -> bool:
+        """Create the group at the stream tail; returns True if it was new."""
+        try:
+            self.r.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+            return True
+        except redis.ResponseError as e:
+            if "BUSYGROUP" in str(e):
+                return False
+            raise
+
+    def _decode(self, entries) -> List[Tuple[str, Dict]]:
+        out = []
+        for msg_id, fields in entries or []:
+            if not fields:
+                # entry trimmed from the stream while pending: nothing to process
+                self.r.xack(self.stream, self.group, msg_id)
+                continue
+            try:
+                out.append((msg_id, json.loads(fields.get("data", ""))))
+            except ValueError:
+                out.append((msg_id, {}))
+        return out
+
+    def read(self, count: int = 10, block_ms: int = 1000) -> List[Tuple[str, Dict]]:
+        if self._backlog_id is not None:
+            resp = self.r.xreadgroup(self.group, self.consumer, {self.stream: self._backlog_id}, count=count)
+            entries = resp[0][1] if resp else []
+            if entries:
+                self._backlog_id = entries[-1][0]
+                return self._decode(entries)
+            self._backlog_id = None
+
+        now = time.monotonic()
+        if self._claim_cursor is None and now - self._last_claim >= self.claim_idle_ms / 1000.0 / 2:
+            self._last_claim = now
+            self._claim_cursor = "0-0"
+        if self._claim_cursor is not None:
+            entries = self._claim(count)
+            if entries:
+                return entries
+
+        resp = self.r.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                 count=count, block=block_ms)
+        return self._decode(resp[0][1]) if resp else []
+
+    def _claim(self, count: int) -> List[Tuple[str, Dict]]:
+        """Up to `claim_pages` XAUTOCLAIM pages from the sweep cursor, until one yields entries."""
+        for _ in range(self.claim_pages):
+            claimed = self.r.xautoclaim(self.stream, self.group, self.consumer,
+                                        min_idle_time=self.claim_idle_ms,
+                                        start_id=self._claim_cursor, count=count)
+            cursor = claimed[0].decode() if isinstance(claimed[0], bytes) else claimed[0]
+            self._claim_cursor = None if cursor == "0-0" else cursor
+            entries = self._decode(claimed[1])
+            if entries or self._claim_cursor is None:
+                return entries
+        return []
+
+    def is_processed(self, event_id: str) -> bool:
+        return bool(event_id) and self.r.zscore(self.k_dedupe, event_id) is not None
+
+    def ack(self, msg_id: str, event_id: Optional[str] = None):
+        pipe = self.r.pipeline(transaction=False)
+        if event_id:
+            now = time.time()
+            pipe.zadd(self.k_dedupe, {event_id: now})
+            pipe.zremrangebyscore(self.k_dedupe, 0, now - self.dedupe_ttl)
+        pipe.xack(self.stream, self.group, msg_id)
+        pipe.execute()
+
+    def pending_count(self) -> int:
+        info = self.r.xpending(self.stream, self.group)
+        return info.get("pending", 0) if isinstance(info, dict) else 0
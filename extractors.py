@@ -0,0 +1,347 @@
+# extractors.py
+# Browser-independent HTML parsing for the dexscreener / dexcheck pages.
+# Every scraper hands its page source to one of the parse_* functions below, so
+# the parser backend can be swapped (and benchmarked) without touching SB code.
+import os
+import re
+import math
+import time
+from typing import Dict, List, Optional
+from bs4 import BeautifulSoup, SoupStrainer
+
+# "lxml" (fast, C) or "html.parser" (stdlib, the original behaviour)
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+# build only the subtrees a parser needs (table rows, trader links, ...)
+PARTIAL_PARSE = os.getenv("PARTIAL_PARSE", "1") == "1"
+# when set, every parsed page is also saved here to grow the fixtures/ corpus
+FIXTURE_DUMP_DIR = os.getenv("FIXTURE_DUMP_DIR")
+
+# address pattern per chain (dexscreener's path segment); add a chain with
+# register_chain() before parsing its pages
+EVM_ADDRESS = r'0x[0-9a-fA-F]{40}'
+ADDRESS_PATTERNS = {
+    "solana": r'[1-9A-HJ-NP-Za-km-z]{32,44}',
+    "ethereum": EVM_ADDRESS,
+    "base": EVM_ADDRESS,
+    "bsc": EVM_ADDRESS,
+    "arbitrum": EVM_ADDRESS,
+    "polygon": EVM_ADDRESS,
+    "avalanche": EVM_ADDRESS,
+    "ton": r'[A-Za-z0-9_-]{48}',
+    "sui": r'0x[0-9a-fA-F]{64}',
+}
+_ADDRESS_RES: Dict[str, "re.Pattern"] = {}
+
+def register_chain(chain: str, pattern: str):
+    ADDRESS_PATTERNS[chain] = pattern
+    _ADDRESS_RES.pop(chain, None)
+
+def address_re(chain: str) -> "re.Pattern":
+    """`/<chain>/<address>` with the address as group 1; KeyError for an unregistered chain."""
+    rx = _ADDRESS_RES.get(chain)
+    if rx is None:
+        rx = _ADDRESS_RES[chain] = re.compile(rf'/{re.escape(chain)}/({ADDRESS_PATTERNS[chain]})', re.IGNORECASE)
+    return rx
+
+SOL_ADDR_RE = address_re("solana")
+LOGO_RE = re.compile(r'cdn\.dexscreener\.com/cms/images/')
+
+def _class_re(cls: str):
+    # strainers see the raw class attribute ("a b c") while parsing, so match a
+    # whole word instead of the exact value
+    return re.compile(r'(?:^|\s)' + re.escape(cls) + r'(?:\s|$)')
+
+TRENDING_ROWS = SoupStrainer("a", class_=_class_re("ds-dex-table-row"))
+TRADER_LINKS = SoupStrainer("a", class_=_class_re("custom-1hhf88o"))
+WALLET_STAT_TAGS = SoupStrainer(["h3", "p", "span"])
+
+def make_soup(html: str, parse_only: Optional[SoupStrainer] = None,
+              backend: Optional[str] = None) -> BeautifulSoup:
+    backend = backend or PARSER_BACKEND
+    if not PARTIAL_PARSE:
+        parse_only = None
+    try:
+        return BeautifulSoup(html, backend, parse_only=parse_only)
+    except Exception:
+        # bs4.FeatureNotFound when lxml isn't installed
+        if backend == "html.parser":
+            raise
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+def dump_fixture(page: str, html: str):
+    if not FIXTURE_DUMP_DIR:
+        return
+    try:
+        os.makedirs(FIXTURE_DUMP_DIR, exist_ok=True)
+        path = os.path.join(FIXTURE_DUMP_DIR, f"{page}_{time.time_ns()}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+    except OSError:
+        pass
+
+# ----------------------------
+# dexscreener trending table
+# ----------------------------
+# "$1.2M" / "3,400" / "12%" -> float, NaN when unparseable
+def parse_num(s: str) -> float:
+    if not s: return math.nan
+    s = s.replace(",", "").strip()
+    mult = 1.0
+    if s.endswith("%"): s = s[:-1]
+    if s.startswith("$"): s = s[1:]
+    if s and s[-1] in "KkMmBb":
+        m = {"K":1e3,"M":1e6,"B":1e9}[s[-1].upper()]
+        mult = m; s = s[:-1]
+    try:
+        return float(s) * mult
+    except:
+        return math.nan
+
+def parse_trending_rows(html: str, n: int, backend: Optional[str] = None,
+                        chain: str = "solana") -> List[Dict]:
+    """Top `n` table rows as raw strings, in page order (rank = index + 1)."""
+    dump_fixture("trending", html)
+    soup = make_soup(html, TRENDING_ROWS, backend)
+    addr_re = address_re(chain)
+    out = []
+    for row in soup.select("a.ds-dex-table-row"):
+        # check the range has been exceeded, if yes -> break
+        if len(out) >= n:
+            break
+
+        href = row.get("href", "")
+        icon = row.select_one("img.ds-dex-table-row-token-icon-img")
+
+        # extract the address from the href or img src
+        m = addr_re.search(href)
+        if not m and icon and icon.get("src"):
+            m = addr_re.search(icon["src"])
+        if not m: continue
+
+        name_node = row.select_one(".ds-dex-table-row-base-token-name-text")
+        symbol_node = row.select_one(".ds-dex-table-row-base-token-symbol")
+        mc_node = row.select_one(".ds-dex-table-row-col-market-cap")
+        liq_node = row.select_one(".ds-dex-table-row-col-liquidity")
+        vol_node = row.select_one(".ds-dex-table-row-col-volume")
+        out.append({
+            "contract": m.group(1).lower(),
+            "name": name_node.get_text(strip=True) if name_node else None,
+            "symbol": symbol_node.get_text(strip=True) if symbol_node else None,
+            "market_cap_raw": mc_node.text.strip() if mc_node else "",
+            "liquidity_raw": liq_node.text.strip() if liq_node else "",
+            "volume_raw": vol_node.text.strip() if vol_node else "",
+            "thumbnail": icon.get("src", "") if icon else "",
+        })
+    return out
+
+# "$1.2M" the way the trending table prints it, so both fetch paths give
+# the same raw strings
+def format_usd(v) -> str:
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return ""
+    if math.isnan(v):
+        return ""
+    for unit, size in (("B", 1e9), ("M", 1e6), ("K", 1e3)):
+        if abs(v) >= size:
+            return f"${v / size:.1f}{unit}"
+    return f"${v:.0f}" if abs(v) >= 1 else f"${v:.4g}"
+
+def parse_trending_pairs(doc, n: int, chain_id: str = "solana") -> List[Dict]:
+    """
+    Top `n` pairs of a JSON pairs document ({"pairs": [...]} or a bare list,
+    dexscreener API pair objects) in the parse_trending_rows row shape.
+    """
+    pairs = doc.get("pairs") if isinstance(doc, dict) else doc
+    addr_re = address_re(chain_id)
+    out = []
+    for pair in pairs or []:
+        if len(out) >= n:
+            break
+        if pair.get("chainId", chain_id) != chain_id:
+            continue
+        base = pair.get("baseToken") or {}
+        address = base.get("address") or ""
+        # the table rows link to the pair page, so `contract` is the pair address there too
+        m = addr_re.search(f"/{chain_id}/{pair.get('pairAddress') or address}")
+        if not m:
+            continue
+        out.append({
+            "contract": m.group(1).lower(),
+            "name": base.get("name"),
+            "symbol": base.get("symbol"),
+            "market_cap_raw": format_usd(pair.get("marketCap", pair.get("fdv"))),
+            "liquidity_raw": format_usd((pair.get("liquidity") or {}).get("usd")),
+            "volume_raw": format_usd((pair.get("volume") or {}).get("h24")),
+            "thumbnail": f"https://dd.dexscreener.com/ds-data/tokens/{chain_id}/{address}.png?size=lg",
+        })
+    return out
+
+# ----------------------------
+# dexscreener pair page: top traders tab
+# ----------------------------
+def parse_trader_wallets(html: str, backend: Optional[str] = None) -> List[str]:
+    """Wallet addresses linked from the Top Traders table, in page order."""
+    dump_fixture("traders", html)
+    soup = make_soup(html, TRADER_LINKS, backend)
+    wallets = []
+    for tag in soup.find_all('a', class_='custom-1hhf88o'):
+        if 'href' in tag.attrs:
+            # https://solscan.io/account/<wallet> -> <wallet>
+            wallets.append(tag['href'].split('/')[-1])
+    return wallets
+
+# ----------------------------
+# dexcheck wallet analyzer
+# ----------------------------
+def _split_profit(text: str):
+    # "$1,234.5 (12.3%)" -> ("1234.5", "12.3")
+    parts = text.split(" ")
+    return (parts[0].replace(",", "").replace("$", ""),
+            parts[1].replace("(", "").replace(")", "").replace("%", ""))
+
+def parse_wallet_stats(html: str, parse_number, backend: Optional[str] = None) -> Dict:
+    """Parse a wallet-analyzer page into the `traders` column values."""
+    dump_fixture("wallet", html)
+    soup = make_soup(html, WALLET_STAT_TAGS, backend)
+    stats = {
+        "gross_profit": None, "realized_profit": None, "realized_profit_percent": None,
+        "unrealized_profit": None, "unrealized_profit_percent": None, "win_rate": None,
+        "wins": None, "losses": None, "trade_volume": None, "trades": None,
+        "avg_trade_size": None, "is_bot": False,
+    }
+
+    def next_p_text(tag, label):
+        node = soup.find(tag, string=re.compile(label, flags=re.I))
+        return node.find_next('p').text.strip() if node else None
+
+    # bot wallets are named like "Bot (gasTzr94Pmp4Gf8vknQnqxeYxdgwFjbgdJa4msYRpnB)"
+    stats["is_bot"] = soup.find('span', string=re.compile(r"^Bot\s*\(", flags=re.I)) is not None
+
+    text = next_p_text('h3', r"Gross Profit")
+    if text is not None:
+        stats["gross_profit"] = parse_number(text)
+    text = next_p_text('p', r"Realized")
+    if text is not None:
+        stats["realized_profit"], stats["realized_profit_percent"] = _split_profit(text)
+    text = next_p_text('p', r"Unrealized")
+    if text is not None:
+        stats["unrealized_profit"], stats["unrealized_profit_percent"] = _split_profit(text)
+
+    for key, tag, label in (
+        ("win_rate", 'h3', r"Win Rate"),
+        ("wins", 'p', r"Win"),
+        ("losses", 'p', r"Lose"),
+        ("trade_volume", 'p', r"Trading Volume"),
+        ("trades", 'p', r"Trades"),
+        ("avg_trade_size", 'p', r"Avg. Trade Size"),
+    ):
+        text = next_p_text(tag, label)
+        if text is not None:
+            stats[key] = parse_number(text)
+    return stats
+
+# ----------------------------
+# dexscreener pair page: token header
+# ----------------------------
+def _has_class(tag, cls: str) -> bool:
+    return cls in (tag.get('class') or [])
+
+def _is_heading(tag) -> bool:
+    return tag.name == 'h2' and _has_class(tag, 'chakra-heading')
+
+def _is_link(tag) -> bool:
+    return tag.name == 'a' and tag.has_attr('href')
+
+def _subtree_index(soup):
+    """
+    Per element: (chakra-stack on it or below, <button> below it, first
+    h2.chakra-heading below it, first <a href> below it). Computed bottom-up in
+    one pass, instead of re-searching every div's subtree, which was quadratic
+    on large pages. Returns (all tags in document order, index keyed by id()).
+    """
+    info = {}
+    tags = soup.find_all(True)
+    for el in reversed(tags):
+        stack = _has_class(el, 'chakra-stack')
+        button = False
+        heading = link = None
+        for child in el.find_all(True, recursive=False):
+            c_stack, c_button, c_heading, c_link = info[id(child)]
+            stack = stack or c_stack
+            button = button or c_button or child.name == 'button'
+            if heading is None:
+                heading = child if _is_heading(child) else c_heading
+            if link is None:
+                link = child if _is_link(child) else c_link
+        info[id(el)] = (stack, button, heading, link)
+    return tags, info
+
+def _heading_text(h2) -> str:
+    span = h2.find('span')
+    return span.get_text(strip=True) if span else h2.get_text(strip=True)
+
+def parse_token_info(html: str, addr: str, backend: Optional[str] = None) -> Dict:
+    dump_fixture("token_info", html)
+    soup = make_soup(html, None, backend)
+
+    # Find the logo image URL
+    logo_img = soup.find('img', src=LOGO_RE)
+    logo_url = logo_img['src'] if logo_img else None
+
+    # Token name: <header> that has (itself or descendants) class 'chakra-stack'
+    # and contains h2.chakra-heading
+    name = None
+    for hdr in soup.find_all('header'):
+        has_stack = _has_class(hdr, 'chakra-stack') or bool(hdr.find(class_='chakra-stack'))
+        if not has_stack:
+            continue
+        h2 = hdr.find('h2', class_='chakra-heading')
+        if not h2:
+            continue
+        text = _heading_text(h2)
+        if text and 1 <= len(text) <= 120:
+            name = text
+            break
+
+    divs, info = _subtree_index(soup)
+    divs = [el for el in divs if el.name == 'div']
+
+    # Token symbol: first <div> with the same structure and a short heading
+    symbol = None
+    for div in divs:
+        stack, _, h2, _ = info[id(div)]
+        if not stack or h2 is None:
+            continue
+        text = _heading_text(h2)
+        if text and 1 <= len(text) <= 20:
+            symbol = text
+            break
+
+    # Pair address: first <div> containing a button whose first link
+    # points at solscan.io/account/<pair>
+    pair_address = None
+    for div in divs:
+        _, button, _, anchor = info[id(div)]
+        if button and anchor is not None and 'solscan.io/account/' in anchor['href']:
+            pair_address = anchor['href'].split('/')[-1]
+            break
+
+    # Audit status: div with text "Audit" followed by "No issues"
+    audit_status = 0
+    audit_label = soup.find('div', string='Audit')
+    if audit_label:
+        value_div = audit_label.find_next_sibling('div')
+        if value_div and "No issues" in value_div.get_text(strip=True):
+            audit_status = 1
+
+    return {
+        # store the contract address in simple letter form
+        'contract': addr.split('/')[-1].lower(),
+        'name': name,
+        'symbol': symbol,
+        'logo_url': logo_url,
+        'pair_address': pair_address,
+        'audit': audit_status,
+    }
@@ -0,0 +1,89 @@
+# feeds.py
+# Trending feeds tracked by the trending extractor: one (chain, rankBy,
+# window size, interval) entry each, all scheduled in one process over the
+# shared browser pool. Every feed keeps its own snapshot keys and event
+# stream; the original solana / trendingScoreH24 feed keeps the un-suffixed
+# ones the trader extractor reads.
+import os
+import json
+from typing import Dict, List, Optional
+from extractors import ADDRESS_PATTERNS
+from event_bus import K_STREAM
+
+DEFAULT_CHAIN = "solana"
+DEFAULT_RANK_BY = "trendingScoreH24"
+
+# dexscreener chain slug -> chain id stored in `tokens.chain` and in events
+CHAIN_IDS = {
+    "solana": "sol",
+    "ethereum": "eth",
+    "base": "base",
+    "bsc": "bsc",
+    "arbitrum": "arb",
+    "polygon": "polygon",
+    "avalanche": "avax",
+    "ton": "ton",
+    "sui": "sui",
+}
+
+TRENDING_URL_TEMPLATE = "https://dexscreener.com/{chain}?rankBy={rank_by}&order=desc"
+
+class Feed:
+    """
+    `api_url` may contain {chain} / {rank_by}; empty means the rendered page
+    only. `prefix` (SnapshotStore) and `stream` (event_bus) default to
+    `trending:<name>` / `<EVENT_STREAM>:<name>` except for the legacy feed.
+    """
+
+    def __init__(self, chain: str = DEFAULT_CHAIN, rank_by: str = DEFAULT_RANK_BY,
+                 window: int = 100, interval: float = 60, url: Optional[str] = None,
+                 api_url: str = "", prefix: Optional[str] = None, stream: Optional[str] = None):
+        if chain not in ADDRESS_PATTERNS:
+            raise ValueError(f"no address pattern registered for chain '{chain}'")
+        self.chain = chain
+        self.chain_id = CHAIN_IDS.get(chain, chain)
+        self.rank_by = rank_by
+        self.name = f"{chain}-{rank_by}"
+        self.window = int(window)
+        self.interval = float(interval)
+        self.url = url or TRENDING_URL_TEMPLATE.format(chain=chain, rank_by=rank_by)
+        self.api_url = api_url.format(chain=chain, rank_by=rank_by) if api_url else ""
+        legacy = chain == DEFAULT_CHAIN and rank_by == DEFAULT_RANK_BY
+        self.prefix = prefix or ("trending" if legacy else f"trending:{self.name}")
+        self.stream = stream or (K_STREAM if legacy else f"{K_STREAM}:{self.name}")
+
+    def link(self, contract: str) -> str:
+        return f"https://dexscreener.com/{self.chain}/{contract}"
+
+    def __repr__(self) -> str:
+        return f"Feed({self.name}, window={self.window}, every {self.interval:g}s)"
+
+def _parse_compact(spec: str) -> Dict:
+    # "solana:trendingScoreH24:100:60" (trailing fields optional)
+    parts = [p.strip() for p in spec.split(":")]
+    keys = ("chain", "rank_by", "window", "interval")
+    return {k: v for k, v in zip(keys, parts) if v}
+
+def load_feeds() -> List[Feed]:
+    """
+    TRENDING_FEEDS as a JSON list of Feed keyword dicts or the compact form
+    "chain:rankBy:window:interval,...". Unset: the single legacy feed from
+    TRENDING_URL / TRENDING_WINDOW_SIZE / TRENDING_INTERVAL_SECONDS.
+    TRENDING_API_URL is every feed's default api_url.
+    """
+    window = int(os.getenv("TRENDING_WINDOW_SIZE", "100"))
+    interval = float(os.getenv("TRENDING_INTERVAL_SECONDS", "60"))
+    api_url = os.getenv("TRENDING_API_URL", "")
+    raw = os.getenv("TRENDING_FEEDS", "").strip()
+    if not raw:
+        return [Feed(window=window, interval=interval, api_url=api_url, url=os.getenv("TRENDING_URL"))]
+
+    specs = json.loads(raw) if raw.startswith("[") else [_parse_compact(s) for s in raw.split(",") if s.strip()]
+    feeds = []
+    for spec in specs:
+        spec = dict({"window": window, "interval": interval, "api_url": api_url}, **spec)
+        feeds.append(Feed(**spec))
+    names = [f.name for f in feeds]
+    if len(set(names)) != len(names):
+        raise ValueError(f"duplicate feeds in TRENDING_FEEDS: {names}")
+    return feeds
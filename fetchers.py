@@ -0,0 +1,187 @@
+# fetchers.py
+# Where the trending rows come from: a JSON pairs endpoint over pooled
+# keep-alive HTTP connections, with the SB-rendered page as the fallback.
+# Every fetcher returns rows in the extractors.parse_trending_rows shape.
+import os
+import gzip
+import json
+import time
+import queue
+import threading
+import http.client
+import urllib.parse
+from typing import Callable, Dict, List, Optional, Tuple
+from extractors import parse_trending_pairs, parse_trending_rows
+
+TRENDING_API_URL = os.getenv("TRENDING_API_URL", "")              # empty = browser only
+TRENDING_API_TIMEOUT = float(os.getenv("TRENDING_API_TIMEOUT", "10"))
+TRENDING_API_RETRY_SECONDS = float(os.getenv("TRENDING_API_RETRY_SECONDS", "300"))   # skip it this long after a failure
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+USER_AGENT = os.getenv("HTTP_USER_AGENT", "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                                          "(KHTML, like Gecko) Chrome/139.0 Safari/537.36")
+
+class FetchError(Exception):
+    pass
+
+class HttpPool:
+    """
+    Keep-alive connections to one host, reused across calls and threads (at
+    most `size` idle ones are kept). A request on a connection the server
+    has since closed is retried once on a fresh one.
+    """
+
+    def __init__(self, base_url: str, size: int = HTTP_POOL_SIZE, timeout: float = TRENDING_API_TIMEOUT):
+        u = urllib.parse.urlparse(base_url)
+        self.https = u.scheme == "https"
+        self.host = u.hostname
+        self.port = u.port
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=max(1, size))
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._requests = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        with self._lock:
+            self._opened += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def get(self, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        headers = dict({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip",
+                        "Connection": "keep-alive"}, **(headers or {}))
+        for attempt in range(2):
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue   # stale keep-alive connection
+                raise
+            with self._lock:
+                self._requests += 1
+            if resp.getheader("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return resp.status, body
+        raise FetchError("unreachable")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"opened": self._opened, "requests": self._requests, "idle": self._idle.qsize()}
+
+_POOLS: Dict[Tuple[str, str, Optional[int]], HttpPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+def shared_pool(url: str) -> HttpPool:
+    """One HttpPool per scheme/host/port, shared by every fetcher of the process."""
+    u = urllib.parse.urlparse(url)
+    key = (u.scheme, u.hostname, u.port)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = HttpPool(url)
+        return pool
+
+class HttpTrendingFetcher:
+    """Trending pairs from a JSON endpoint (see parse_trending_pairs for the format)."""
+    name = "http"
+
+    def __init__(self, url: str = TRENDING_API_URL, chain_id: str = "solana",
+                 pool: Optional[HttpPool] = None):
+        u = urllib.parse.urlparse(url)
+        self.path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.chain_id = chain_id
+        self.pool = pool or shared_pool(url)
+
+    def fetch(self, n: int) -> List[Dict]:
+        status, body = self.pool.get(self.path, {"Accept": "application/json"})
+        if status != 200:
+            raise FetchError(f"HTTP {status}")
+        try:
+            doc = json.loads(body)
+        except ValueError as e:
+            raise FetchError(f"bad JSON: {e}")
+        return parse_trending_pairs(doc, n, self.chain_id)
+
+class BrowserTrendingFetcher:
+    """The rendered trending page in a leased pool browser."""
+    name = "browser"
+
+    def __init__(self, pool, url: str, readiness, log: Callable[[str], None] = print,
+                 chain: str = "solana"):
+        self.pool = pool
+        self.url = url
+        self.chain = chain
+        self.readiness = readiness
+        self.log = log
+
+    def fetch(self, n: int) -> List[Dict]:
+        with self.pool.lease() as browser:
+            sb = browser.sb
+            self.log(f"Navigate: {self.url}")
+            browser.open(self.url)
+            took = self.readiness.wait(sb, "trending")
+            self.log(f"Trending page ready in {took:.1f}s")
+            html = sb.get_page_source()
+        return parse_trending_rows(html, n, chain=self.chain)
+
+class FallbackFetcher:
+    """
+    Tries `fetchers` in order and returns the first result with at least
+    `min_rows` rows. A fetcher that failed is skipped for `retry_after`
+    seconds so a dead endpoint doesn't add its timeout to every cycle; the
+    last fetcher is always tried.
+    """
+
+    def __init__(self, fetchers: List, min_rows: int = 1,
+                 retry_after: float = TRENDING_API_RETRY_SECONDS,
+                 log: Callable[[str], None] = print):
+        self.fetchers = fetchers
+        self.min_rows = min_rows
+        self.retry_after = retry_after
+        self.log = log
+        self._skip_until: Dict[str, float] = {}
+        self._served: Dict[str, int] = {f.name: 0 for f in fetchers}
+        self._failed: Dict[str, int] = {f.name: 0 for f in fetchers}
+        self.last_source: Optional[str] = None
+
+    def fetch(self, n: int) -> List[Dict]:
+        last_error = None
+        for i, fetcher in enumerate(self.fetchers):
+            is_last = i == len(self.fetchers) - 1
+            if not is_last and time.monotonic() < self._skip_until.get(fetcher.name, 0):
+                continue
+            try:
+                rows = fetcher.fetch(n)
+                if len(rows) < min(n, self.min_rows):
+                    raise FetchError(f"only {len(rows)} rows")
+            except Exception as e:
+                last_error = e
+                self._failed[fetcher.name] += 1
+                self._skip_until[fetcher.name] = time.monotonic() + self.retry_after
+                self.log(f"{fetcher.name} fetch failed: {e}")
+                continue
+            self._served[fetcher.name] += 1
+            self.last_source = fetcher.name
+            return rows
+        raise FetchError(f"every fetcher failed, last error: {last_error}")
+
+    def stats(self) -> Dict:
+        return {"served": dict(self._served), "failed": dict(self._failed), "last_source": self.last_source}
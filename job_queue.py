@@ -0,0 +1,272 @@
+# job_queue.py
+# Redis-backed job queue for slow scrapes: `enqueue()` returns a job id at
+# once, a JobRunner works the queue on a bounded thread pool, and results are
+# kept under the id for polling (and optionally POSTed to a callback URL).
+import os
+import json
+import time
+import uuid
+import socket
+import ipaddress
+import ssl
+import threading
+import http.client
+import urllib.parse
+from typing import Any, Callable, Dict, Optional
+import redis
+from worker_pool import WorkerPool
+
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))        # seconds a finished job stays readable
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+JOB_CALLBACK_RETRIES = int(os.getenv("JOB_CALLBACK_RETRIES", "3"))
+# hosts callbacks may go to; empty = any host that resolves to public addresses only
+JOB_CALLBACK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class JobQueue:
+    """
+    Keys under `jobs:<name>`:
+      :queue                   pending job ids (LPUSH in, BLMOVE out from the right)
+      :processing:<consumer>   ids a consumer has taken and not finished yet
+      :<job_id>                hash: status, payload, result / error, timestamps
+    Taking a job moves it atomically onto the consumer's processing list, so
+    jobs held by a process that died are put back by `recover()` on restart.
+    """
+
+    def __init__(self, r, name: str, consumer: Optional[str] = None,
+                 result_ttl: int = JOB_RESULT_TTL):
+        self.r = r
+        self.prefix = f"jobs:{name}"
+        self.consumer = consumer or os.getenv("JOB_CONSUMER") or socket.gethostname()
+        self.k_queue = f"{self.prefix}:queue"
+        self.k_processing = f"{self.prefix}:processing:{self.consumer}"
+        self.result_ttl = result_ttl
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def enqueue(self, payload: Dict, callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        pipe = self.r.pipeline()   # MULTI: the hash exists before the id is visible
+        pipe.hset(self._job_key(job_id), mapping={
+            "id": job_id,
+            "status": QUEUED,
+            "payload": json.dumps(payload),
+            "callback_url": callback_url or "",
+            "created_at": time.time(),
+        })
+        pipe.lpush(self.k_queue, job_id)
+        pipe.execute()
+        return job_id
+
+    def take(self, timeout: float = 1.0) -> Optional[str]:
+        """Block up to `timeout` seconds for the next job id."""
+        return self.r.blmove(self.k_queue, self.k_processing, timeout, "RIGHT", "LEFT")
+
+    def recover(self) -> int:
+        """Requeue jobs this consumer took but never finished (crash, restart)."""
+        moved = 0
+        while self.r.lmove(self.k_processing, self.k_queue, "RIGHT", "RIGHT"):
+            moved += 1
+        return moved
+
+    def mark_running(self, job_id: str):
+        self.r.hset(self._job_key(job_id), mapping={"status": RUNNING, "started_at": time.time()})
+
+    def finish(self, job_id: str, result: Any = None, error: Optional[str] = None):
+        fields = {"status": FAILED if error else DONE, "finished_at": time.time()}
+        if error:
+            fields["error"] = error
+        else:
+            fields["result"] = json.dumps(result)
+        pipe = self.r.pipeline()
+        pipe.hset(self._job_key(job_id), mapping=fields)
+        pipe.expire(self._job_key(job_id), self.result_ttl)
+        pipe.lrem(self.k_processing, 1, job_id)
+        pipe.execute()
+
+    def set_field(self, job_id: str, field: str, value: Any):
+        self.r.hset(self._job_key(job_id), field, value)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.r.hgetall(self._job_key(job_id))
+        if not job:
+            return None
+        for field in ("payload", "result"):
+            if field in job:
+                job[field] = json.loads(job[field])
+        for field in ("created_at", "started_at", "finished_at"):
+            if field in job:
+                job[field] = float(job[field])
+        return job
+
+    def discard(self, job_id: str):
+        self.r.lrem(self.k_processing, 1, job_id)
+
+    def depth(self) -> int:
+        return self.r.llen(self.k_queue)
+
+    def in_progress(self) -> int:
+        return self.r.llen(self.k_processing)
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to the address resolve_callback() checked; Host stays the URL's host."""
+
+    def __init__(self, host: str, port: int, ip: str, timeout: float):
+        super().__init__(host, port, timeout=timeout)
+        self.ip = ip
+
+    def connect(self):
+        self.sock = socket.create_connection((self.ip, self.port), self.timeout)
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """As _PinnedHTTPConnection, with SNI and certificate checks against the URL's host."""
+
+    def __init__(self, host: str, port: int, ip: str, timeout: float):
+        super().__init__(host, port, timeout=timeout, context=ssl.create_default_context())
+        self.ip = ip
+
+    def connect(self):
+        sock = socket.create_connection((self.ip, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+def _allowed_ip(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def resolve_callback(url: str) -> Optional[str]:
+    """
+    The address to POST `url` to, or None if it is refused: not http(s), or
+    a host outside JOB_CALLBACK_ALLOWED_HOSTS or, without an allowlist, one
+    that resolves to any non-public address (loopback, private, link-local,
+    ...), so job callbacks can't be aimed at the API's own network. The
+    callback connects to this address rather than resolving the host again,
+    so a host can't rebind to an internal address after the check.
+    """
+    u = urllib.parse.urlparse(url)
+    if u.scheme not in ("http", "https") or not u.hostname:
+        return None
+    try:
+        port = u.port or (443 if u.scheme == "https" else 80)
+    except ValueError:
+        return None
+    allowlisted = u.hostname.lower() in JOB_CALLBACK_ALLOWED_HOSTS
+    if JOB_CALLBACK_ALLOWED_HOSTS and not allowlisted:
+        return None
+    try:
+        infos = socket.getaddrinfo(u.hostname, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        return None
+    addresses = [info[4][0] for info in infos]
+    if not addresses or not (allowlisted or all(_allowed_ip(a) for a in addresses)):
+        return None
+    return addresses[0]
+
+def valid_callback_url(url: str) -> bool:
+    return resolve_callback(url) is not None
+
+def post_callback(url: str, body: Dict, ip: Optional[str] = None, timeout: float = JOB_CALLBACK_TIMEOUT,
+                  retries: int = JOB_CALLBACK_RETRIES) -> Optional[int]:
+    """
+    POST `body` as JSON to `url` over a connection to `ip` (default: what
+    resolve_callback() returns); returns the HTTP status, or None if the URL
+    was refused or every attempt failed. Redirects are not followed.
+    """
+    ip = ip or resolve_callback(url)
+    if ip is None:
+        return None
+    u = urllib.parse.urlparse(url)
+    cls = _PinnedHTTPSConnection if u.scheme == "https" else _PinnedHTTPConnection
+    port = u.port or (443 if u.scheme == "https" else 80)
+    path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+    data = json.dumps(body).encode()
+    for attempt in range(retries):
+        conn = cls(u.hostname, port, ip, timeout)
+        try:
+            conn.request("POST", path, body=data, headers={"Content-Type": "application/json"})
+            status = conn.getresponse().status
+            if status < 500:
+                return status   # includes rejections and redirects; retrying won't help
+        except (http.client.HTTPException, OSError):
+            pass
+        finally:
+            conn.close()
+        time.sleep(2 ** attempt)
+    return None
+
+class JobRunner:
+    """
+    One dispatcher thread moves job ids from Redis into a WorkerPool of
+    `workers` threads. The pool's local queue is only `workers` deep, so
+    `submit()` blocks the dispatcher while everyone is busy and the backlog
+    stays in Redis, where it is visible as `JobQueue.depth()`.
+    """
+
+    def __init__(self, jobs: JobQueue, handler: Callable[[Dict], Any], workers: int = 2,
+                 name: str = "job", log: Callable[[str], None] = print):
+        self.jobs = jobs
+        self.handler = handler
+        self.log = log
+        self.pool = WorkerPool(self._run_job, workers=workers, queue_size=workers, name=name)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._dispatch, name=f"{name}-dispatch", daemon=True)
+
+    def start(self):
+        requeued = self.jobs.recover()
+        if requeued:
+            self.log(f"Requeued {requeued} unfinished jobs")
+        self._thread.start()
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self.jobs.take(timeout=1)
+            except redis.RedisError as e:
+                self.log(f"Job queue unavailable: {e}")
+                time.sleep(1)
+                continue
+            if job_id:
+                self.pool.submit(job_id)
+
+    def _run_job(self, job_id: str):
+        job = self.jobs.get(job_id)
+        if job is None:
+            # hash expired or was deleted while queued
+            self.jobs.discard(job_id)
+            return
+        self.jobs.mark_running(job_id)
+        try:
+            result = self.handler(job["payload"])
+            self.jobs.finish(job_id, result=result)
+        except Exception as e:
+            self.log(f"Job {job_id} failed: {e}")
+            self.jobs.finish(job_id, error=str(e))
+
+        if job.get("callback_url"):
+            # checked again (the host may resolve differently than at enqueue
+            # time) and the POST goes to the address that passed the check
+            ip = resolve_callback(job["callback_url"])
+            if ip is None:
+                self.log(f"Job {job_id}: callback URL refused")
+                self.jobs.set_field(job_id, "callback_status", "refused")
+                return
+            status = post_callback(job["callback_url"], self.jobs.get(job_id) or {"id": job_id}, ip=ip)
+            self.jobs.set_field(job_id, "callback_status", status or "failed")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop taking jobs and let the running ones finish."""
+        self._stop.set()
+        self._thread.join(timeout)
+        self.pool.drain(timeout)
+
+    def stats(self) -> Dict:
+        stats = self.pool.stats()
+        try:
+            stats["queue_depth"] = self.jobs.depth()
+            stats["in_progress"] = self.jobs.in_progress()
+        except redis.RedisError:
+            stats["queue_depth"] = stats["in_progress"] = None
+        return stats
@@ -0,0 +1,140 @@
+# leaderboard.py
+# The `well_performed` leaderboard: wallets whose latest stats pass the
+# thresholds. Kept current incrementally from each batch of wallet rows, so
+# reads never wait on a rebuild.
+#
+#   python leaderboard.py top [--order gross_profit] [--limit 20]
+#   python leaderboard.py rebuild      # re-evaluate every wallet after changing thresholds
+import os
+import argparse
+from typing import Dict, List, Optional
+from wallet_store import STATS_FIELDS
+
+def thresholds_from_env() -> Dict:
+    return {
+        "gross_profit": float(os.getenv("LEADERBOARD_MIN_GROSS_PROFIT", "500")),
+        "win_rate": float(os.getenv("LEADERBOARD_MIN_WIN_RATE", "55")),
+        "trades": int(os.getenv("LEADERBOARD_MIN_TRADES", "20")),
+        "avg_trade_size": float(os.getenv("LEADERBOARD_MIN_AVG_TRADE_SIZE", "50")),
+    }
+
+THRESHOLDS = thresholds_from_env()
+EXCLUDE_BOTS = os.getenv("LEADERBOARD_EXCLUDE_BOTS", "1") == "1"
+
+ORDER_BY = ("gross_profit", "win_rate")   # indexed orderings
+
+_COLS = ", ".join(STATS_FIELDS)
+_VALS = ", ".join(["%s"] * len(STATS_FIELDS))
+
+UPSERT_LEADER_SQL = f"""
+    INSERT INTO well_performed (wallet_address, token_address, {_COLS})
+    VALUES (%s, %s, {_VALS})
+    ON DUPLICATE KEY UPDATE
+        token_address=VALUES(token_address),
+        {", ".join(f"{f}=VALUES({f})" for f in STATS_FIELDS)}
+"""
+
+DELETE_LEADER_SQL = "DELETE FROM well_performed WHERE wallet_address = %s"
+
+def qualifies(stats: Dict, thresholds: Dict = THRESHOLDS, exclude_bots: bool = EXCLUDE_BOTS) -> bool:
+    # missing values never qualify, same as NULL comparisons in rebuild()
+    for field, minimum in thresholds.items():
+        value = stats.get(field)
+        if value is None or float(value) < minimum:
+            return False
+    return not (exclude_bots and stats.get("is_bot"))
+
+def update_leaderboard(cursor, rows: List[tuple], thresholds: Dict = THRESHOLDS,
+                       exclude_bots: bool = EXCLUDE_BOTS):
+    """
+    Re-evaluate just the wallets in `rows` (wallet_store.observation_row
+    tuples), inside the caller's transaction.
+    """
+    latest = {}
+    for row in rows:
+        latest[row[0]] = row
+    upserts, deletes = [], []
+    for wallet, row in latest.items():
+        stats = dict(zip(STATS_FIELDS, row[3:]))
+        if qualifies(stats, thresholds, exclude_bots):
+            upserts.append((wallet, row[1]) + row[3:])
+        else:
+            deletes.append((wallet,))
+    if upserts:
+        cursor.executemany(UPSERT_LEADER_SQL, upserts)
+    if deletes:
+        cursor.executemany(DELETE_LEADER_SQL, deletes)
+
+def _where(thresholds: Dict, exclude_bots: bool):
+    sql = " AND ".join(f"w.{field} >= %s" for field in thresholds)
+    if exclude_bots:
+        sql += " AND NOT COALESCE(w.is_bot, 0)"
+    return sql, tuple(thresholds.values())
+
+def rebuild(cursor, thresholds: Dict = THRESHOLDS, exclude_bots: bool = EXCLUDE_BOTS):
+    """
+    Re-evaluate every wallet (after a threshold change). Upsert + targeted
+    delete in one transaction instead of TRUNCATE, so readers keep seeing
+    the previous leaderboard until it commits.
+    """
+    where, params = _where(thresholds, exclude_bots)
+    cursor.execute(f"""
+        INSERT INTO well_performed (wallet_address, token_address, {_COLS})
+        SELECT w.wallet_address,
+               (SELECT o.token_address FROM wallet_observations o
+                WHERE o.wallet_address = w.wallet_address
+                ORDER BY o.observed_at DESC, o.id DESC LIMIT 1),
+               {", ".join(f"w.{f}" for f in STATS_FIELDS)}
+        FROM wallets w WHERE {where}
+        ON DUPLICATE KEY UPDATE {", ".join(f"{f}=VALUES({f})" for f in STATS_FIELDS)}
+    """, params)
+    cursor.execute(f"""
+        DELETE lb FROM well_performed lb
+        LEFT JOIN wallets w ON w.wallet_address = lb.wallet_address AND {where}
+        WHERE w.wallet_address IS NULL
+    """, params)
+
+def read_leaderboard(db, order_by: str = "gross_profit", limit: int = 50,
+                     offset: int = 0) -> List[Dict]:
+    if order_by not in ORDER_BY:
+        raise ValueError(f"order must be one of {', '.join(ORDER_BY)}")
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT wallet_address, token_address, {_COLS}, qualified_at, updated_at "
+            f"FROM well_performed ORDER BY {order_by} DESC LIMIT %s OFFSET %s",
+            (limit, offset))
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="well_performed leaderboard")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    top = sub.add_parser("top", help="print the leaderboard")
+    top.add_argument("--order", choices=ORDER_BY, default="gross_profit")
+    top.add_argument("--limit", type=int, default=20)
+    sub.add_parser("rebuild", help="re-evaluate all wallets against the current thresholds")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    # after load_dotenv() so DB_URL from .env is visible
+    from db import DBPool
+    from schema import ensure_leaderboard_table
+    db = DBPool(size=1)
+    db.run(ensure_leaderboard_table)
+
+    if args.cmd == "rebuild":
+        # re-read: .env was loaded after this module's defaults were computed
+        thresholds = thresholds_from_env()
+        exclude_bots = os.getenv("LEADERBOARD_EXCLUDE_BOTS", "1") == "1"
+        db.run(lambda cur: rebuild(cur, thresholds, exclude_bots))
+        print(f"Rebuilt well_performed with thresholds {thresholds} (exclude bots: {exclude_bots})")
+        return
+    for rank, w in enumerate(read_leaderboard(db, args.order, args.limit), start=1):
+        print(f"{rank:>3}  {w['wallet_address']}  gross_profit={w['gross_profit']}  "
+              f"win_rate={w['win_rate']}  trades={w['trades']}  avg_trade_size={w['avg_trade_size']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,45 @@
 # trending_extractor_redis.py
-import os, json, time, random, threading, datetime as dt, math
-import pytz, re
+import os, time, threading, datetime as dt, math, atexit
+import pytz
 import redis  # pip install redis
 from typing import List, Dict, Tuple
-from seleniumbase import SB
-from bs4 import BeautifulSoup
 import mysql.connector
-import urllib.parse
+from browser_pool import BrowserPool
+from db import DBPool, TRANSIENT_ERRORS, ensure_database
+from schema import ensure_tokens_table, ensure_token_metrics_table
+from extractors import parse_num
+from feeds import Feed, load_feeds
+from fetchers import BrowserTrendingFetcher, FallbackFetcher, HttpTrendingFetcher
+from trending_diff import DiffEngine
+from event_bus import publish_events
+from snapshot_store import SnapshotStore
+from token_history import HISTORY_RETAIN_DAYS, INSERT_METRICS_SQL, history_rows
+from write_behind import WriteBehindBuffer
+from readiness import Readiness
+from session_store import ClearanceStore
+from worker_pool import WorkerPool
 
 # ----------------------------
 # Settings
 # ----------------------------
 REDIS_URL  = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-TRENDING_URL = os.getenv(
-    "TRENDING_URL",
-    "https://dexscreener.com/solana?rankBy=trendingScoreH24&order=desc"
-)
-CHAIN = "sol"
-WINDOW_SIZE = int(os.getenv("TRENDING_WINDOW_SIZE", "100"))
-INTERVAL_SEC = int(os.getenv("TRENDING_INTERVAL_SECONDS", "60"))
+# the (chain, rankBy, window, interval) feeds to track: TRENDING_FEEDS, or the
+# single solana feed from TRENDING_URL / TRENDING_WINDOW_SIZE /
+# TRENDING_INTERVAL_SECONDS (see feeds.py)
+FEEDS = load_feeds()
 RANK_MOVE_THRESHOLD = int(os.getenv("RANK_MOVE_THRESHOLD", "999999"))  # start with only add/remove
+# hysteresis: members stay until they fall below a feed's window + EXIT_MARGIN
+# (extra rows are scraped for this) for EXIT_CYCLES consecutive cycles
+EXIT_MARGIN = int(os.getenv("TRENDING_EXIT_MARGIN", "10"))
+EXIT_CYCLES = int(os.getenv("TRENDING_EXIT_CYCLES", "2"))
 TZ = pytz.timezone(os.getenv("TZ", "Asia/Colombo"))
 HEADLESS = True
 DEBUG = True
 
 DB_WRITE = True  # Set to False to disable DB writes (for testing)
 
-db_url = os.getenv("DB_URL")  # Set this in your .env file
-
-if not db_url:
-    raise RuntimeError("DB_URL environment variable is required")
-
-url = urllib.parse.urlparse(db_url)
-
-sqldb = mysql.connector.connect(
-    host=url.hostname,
-    port=url.port,
-    user=url.username,
-    password=url.password,
-    database=url.path.lstrip("/"),
-    ssl_disabled=False
-)
-
-sql_cursor = sqldb.cursor()
+# pooled MySQL connections from DB_URL (see db.py); opened lazily
+DB = DBPool()
 
 def dprint(msg: str):
     if DEBUG:
@@ -51,103 +48,70 @@ def dprint(msg: str):
 
 r = redis.from_url(REDIS_URL, decode_responses=True)
 
-# redis keys
-K_LATEST_VER = "trending:latest_version"          # string int
-K_WINDOW_VER = "trending:window:{ver}"            # json array
-K_WINDOW_META= "trending:window:{ver}:meta"       # hash (as_of)
+# binary client for the versioned window snapshots (see snapshot_store.py)
+r_bin = redis.from_url(REDIS_URL)
+
+# Cloudflare clearance saved per domain and loaded into new/recycled browsers
+SESSIONS = ClearanceStore(r)
+
+# page-ready polling with timeouts learned from past load times (see readiness.py)
+READINESS = Readiness(r, sessions=SESSIONS)
+
+# warm browsers reused across cycles and shared by every feed instead of a
+# cold Chrome per scrape (started on first lease, so never while the JSON
+# endpoint keeps working)
+BROWSER_POOL = BrowserPool(headless=HEADLESS, sessions=SESSIONS, readiness=READINESS)
+
+# feeds due at the same time run side by side up to this many at once;
+# browser leases still queue on BROWSER_POOL_SIZE
+FEED_WORKERS = int(os.getenv("TRENDING_FEED_WORKERS", str(BROWSER_POOL.size)))
+
+class FeedState:
+    """Everything one feed keeps between its cycles."""
+
+    def __init__(self, feed: Feed):
+        self.feed = feed
+        # versioned window snapshots under the feed's prefix
+        self.snapshots = SnapshotStore(r_bin, prefix=feed.prefix)
+        # trending rows from the feed's api_url when set, the rendered page
+        # otherwise or whenever the endpoint fails (see fetchers.py)
+        self.fetcher = FallbackFetcher(
+            ([HttpTrendingFetcher(feed.api_url, chain_id=feed.chain)] if feed.api_url else [])
+            + [BrowserTrendingFetcher(BROWSER_POOL, feed.url, READINESS, log=dprint, chain=feed.chain)],
+            min_rows=feed.window,
+            log=dprint,
+        )
+        # in-memory rank index; seeded from the last saved window on the first cycle
+        self.diff = DiffEngine(feed.window, RANK_MOVE_THRESHOLD, EXIT_MARGIN, EXIT_CYCLES)
+        # contract -> row tuple last committed, so unchanged rows are not re-sent
+        self.last_written: Dict[str, Tuple] = {}
+        self.cycles = 0
+        self.last_run_s = 0.0
+        self.short_margin_logged = False
+
+FEED_STATES = [FeedState(feed) for feed in FEEDS]
 
 # ----------------------------
 # Helpers
 # ----------------------------
-def parse_num(s: str) -> float:
-    if not s: return math.nan
-    s = s.replace(",", "").strip()
-    mult = 1.0
-    if s.endswith("%"): s = s[:-1]
-    if s.startswith("$"): s = s[1:]
-    if s and s[-1] in "KkMmBb":
-        m = {"K":1e3,"M":1e6,"B":1e9}[s[-1].upper()]
-        mult = m; s = s[:-1]
-    try:
-        return float(s) * mult
-    except:
-        return math.nan
-
-SOL_ADDR_RE = re.compile(r'/solana/([1-9A-HJ-NP-Za-km-z]{32,44})', re.IGNORECASE)
-
-def scrape_trending_topN(n: int) -> List[Dict]:
-    with SB(uc=True, test=True, locale_code="en", headless=HEADLESS) as sb:
-        dprint(f"Navigate: {TRENDING_URL}")
-        sb.activate_cdp_mode(TRENDING_URL)
-        sb.sleep(4)
-        try: sb.uc_gui_click_captcha()
-        except Exception as e: dprint(f"Captcha not present/ignored: {e}")
-        sb.wait_for_element_visible('img.ds-dex-table-row-token-icon-img', timeout=50)
-        html = sb.get_page_source()
-
-    soup = BeautifulSoup(html, "html.parser")
-    rows = soup.select("a.ds-dex-table-row")
-    out = []
-    rank = 1
-    for row in rows:
+def scrape_trending_topN(state: FeedState, n: int) -> List[Dict]:
+    feed = state.feed
+    raw_rows = state.fetcher.fetch(n)
+    dprint(f"[{feed.name}] Fetched {len(raw_rows)} rows via {state.fetcher.last_source} | "
+           f"Fetchers: {state.fetcher.stats()} | Sessions: {SESSIONS.stats()}")
 
-        # check the range has been exceeded, if yes -> break
-        if rank > n: 
-            break
-        
-        href = row.get("href","")
-
-        # extract the SOL address from the href or img src
-        m = SOL_ADDR_RE.search(href)
-        if not m:
-            img = row.select_one("img.ds-dex-table-row-token-icon-img")
-            if img and img.get("src"):
-                m = SOL_ADDR_RE.search(img["src"])
-        if not m: continue
-
-        # extract the token information
-        contract = m.group(1)
-        contract = contract.lower()
-        name = (row.select_one(".ds-dex-table-row-base-token-name-text") or {}).get_text(strip=True) if row.select_one(".ds-dex-table-row-base-token-name-text") else None
-        symbol = (row.select_one(".ds-dex-table-row-base-token-symbol") or {}).get_text(strip=True) if row.select_one(".ds-dex-table-row-base-token-symbol") else None
-        mc_node = row.select_one(".ds-dex-table-row-col-market-cap")
-        liq_node = row.select_one(".ds-dex-table-row-col-liquidity")
-        vol_node = row.select_one(".ds-dex-table-row-col-volume") 
-        market_cap = mc_node.text.strip() if mc_node else ""
-        liquidity  = liq_node.text.strip() if liq_node else ""
-        volume     = vol_node.text.strip() if vol_node else ""
-        thumbnail  = (row.select_one("img.ds-dex-table-row-token-icon-img") or {}).get("src","") if row.select_one("img.ds-dex-table-row-token-icon-img") else ""
-
-        # store in DB
-        if DB_WRITE:
-            try:
-                sql_cursor.execute("""
-                    INSERT INTO tokens (contract, chain, name, symbol, market_cap, liquidity, volume, thumbnail)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        name=VALUES(name),
-                        symbol=VALUES(symbol),
-                        market_cap=VALUES(market_cap),
-                        liquidity=VALUES(liquidity),
-                        volume=VALUES(volume),
-                        thumbnail=VALUES(thumbnail)
-                """, (
-                    contract,
-                    CHAIN,
-                    name,
-                    symbol,
-                    parse_num(market_cap),
-                    parse_num(liquidity),
-                    parse_num(volume),
-                    thumbnail
-                ))
-                sqldb.commit()
-            except mysql.connector.Error as err:
-                dprint(f"Error inserting/updating token {contract}: {err}")
+    out = []
+    for rank, row in enumerate(raw_rows, start=1):
+        contract = row["contract"]
+        name, symbol = row["name"], row["symbol"]
+        market_cap = row["market_cap_raw"]
+        liquidity  = row["liquidity_raw"]
+        volume     = row["volume_raw"]
+        thumbnail  = row["thumbnail"]
 
         # append to output
         out.append({
-            "chain": CHAIN,
+            "chain": feed.chain_id,
             "contract": contract,
             "name": name,
             "symbol": symbol,
@@ -158,30 +122,89 @@ def scrape_trending_topN(n: int) -> List[Dict]:
             "market_cap": parse_num(market_cap),
             "liquidity": parse_num(liquidity),
             "volume": parse_num(volume),
-            "link": f"https://dexscreener.com/solana/{contract}",
+            "link": feed.link(contract),
+            "thumbnail": thumbnail,
         })
-        rank += 1
 
     # dprint(f"Scraped {len(out)} tokens")
     return out
 
-def compute_diff(prev: List[Dict], curr: List[Dict], rank_move_threshold: int):
-    prev_idx = {(t["chain"], t["contract"]): t["rank"] for t in prev}
-    curr_idx = {(t["chain"], t["contract"]): t["rank"] for t in curr}
-    prev_keys, curr_keys = set(prev_idx.keys()), set(curr_idx.keys())
-
-    added = [(k, curr_idx[k]) for k in (curr_keys - prev_keys)]
-    removed = [(k, prev_idx[k]) for k in (prev_keys - curr_keys)]
-    moved = []
-    for k in (prev_keys & curr_keys):
-        dr = prev_idx[k] - curr_idx[k]
-        if abs(dr) >= rank_move_threshold:
-            moved.append((k, prev_idx[k], curr_idx[k]))
-    return added, removed, moved
-
-def publish_token_change(change_type, chain, contract, old_rank, new_rank, window_version, as_of):
-    payload = {
-        "event_id": f"{chain}:{contract}:{window_version}:{change_type}:{old_rank}:{new_rank}",
+# updated_at tracks the token-info scrape (token-info-api.py), not market data
+UPSERT_TOKENS_SQL = """
+    INSERT INTO tokens (contract, chain, name, symbol, market_cap, liquidity, volume, thumbnail)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name=VALUES(name),
+        symbol=VALUES(symbol),
+        market_cap=VALUES(market_cap),
+        liquidity=VALUES(liquidity),
+        volume=VALUES(volume),
+        thumbnail=VALUES(thumbnail),
+        updated_at=updated_at
+"""
+
+def _db_num(v: float):
+    # MySQL DOUBLE can't hold NaN (unparseable cell) -> NULL
+    return None if v is None or math.isnan(v) else v
+
+def write_tokens(state: FeedState, tokens: List[Dict]) -> int:
+    """
+    Upsert the window into `tokens` in one transaction (executemany is sent as
+    a single multi-row INSERT). Returns the number of rows written.
+    """
+    rows = []
+    for t in tokens:
+        row = (t["contract"], t["chain"], t["name"], t["symbol"],
+               _db_num(t["market_cap"]), _db_num(t["liquidity"]), _db_num(t["volume"]),
+               t["thumbnail"])
+        if state.last_written.get(t["contract"]) != row:
+            rows.append(row)
+    if not rows:
+        dprint(f"DB upsert: 0/{len(tokens)} rows changed, skipped")
+        return 0
+
+    start = time.perf_counter()
+    try:
+        DB.run(lambda cur: cur.executemany(UPSERT_TOKENS_SQL, rows))
+    except (mysql.connector.Error, TimeoutError) as err:
+        dprint(f"Error upserting {len(rows)} tokens: {err}")
+        return 0
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    # only remember the current window so the map doesn't grow with churn
+    current = {t["contract"] for t in tokens}
+    state.last_written = {c: row for c, row in state.last_written.items() if c in current}
+    for row in rows:
+        state.last_written[row[0]] = row
+    dprint(f"DB upsert: {len(rows)}/{len(tokens)} rows changed, written in {elapsed_ms:.0f} ms")
+    return len(rows)
+
+def _flush_history(rows: List[tuple]):
+    """Runs on the write-behind thread: one multi-row insert per batch."""
+    DB.run(lambda cur: cur.executemany(INSERT_METRICS_SQL, rows))
+
+# every scraped window is appended to token_metrics in the background, so a
+# slow DB doesn't stretch the scrape cycle
+HISTORY_SINK = WriteBehindBuffer(
+    _flush_history,
+    name="history-sink",
+    batch_size=int(os.getenv("HISTORY_FLUSH_BATCH", "500")),
+    flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL", "10")),
+    max_pending=int(os.getenv("HISTORY_MAX_PENDING_ROWS", "20000")),
+    log=dprint,
+    transient_errors=TRANSIENT_ERRORS,
+)
+atexit.register(HISTORY_SINK.close)
+
+def record_history(state: FeedState, tokens: List[Dict], as_of: dt.datetime):
+    for row in history_rows(tokens, as_of.timestamp(), state.feed.name):
+        HISTORY_SINK.put(row)
+
+def token_change_payload(feed, change_type, chain, contract, old_rank, new_rank, window_version, as_of) -> Dict:
+    # feeds on the same chain can reach the same window version, so the id carries the feed
+    return {
+        "event_id": f"{feed}:{chain}:{contract}:{window_version}:{change_type}:{old_rank}:{new_rank}",
+        "feed": feed,
         "as_of": as_of.isoformat(),
         "change_type": change_type,
         "chain": chain,
@@ -190,89 +213,115 @@ def publish_token_change(change_type, chain, contract, old_rank, new_rank, windo
         "new_rank": new_rank,
         "window_version": window_version
     }
-    r.publish("token_changed", json.dumps(payload))
-    dprint(f"Published token_changed: {payload}")
 
-def get_latest_version() -> int:
-    v = r.get(K_LATEST_VER)
-    return int(v) if v else 0
+def publish_token_changes(state: FeedState, payloads: List[Dict]):
+    """Append a whole cycle's events to the feed's token_changed stream in one round-trip."""
+    ids = publish_events(r, payloads, stream=state.feed.stream)
+    for msg_id, payload in zip(ids, payloads):
+        dprint(f"Published token_changed {msg_id}: {payload}")
 
-def save_window(curr: List[Dict], as_of: dt.datetime) -> int:
+def get_latest_version(state: FeedState) -> int:
+    return state.snapshots.latest_version()
+
+def save_window(state: FeedState, curr: List[Dict], as_of: dt.datetime) -> int:
     """
-    Atomically bump the version and store the latest snapshot in Redis.
+    Bump the version and store the latest snapshot in Redis (old versions are trimmed).
     """
-    pipe = r.pipeline()
-    # next version
-    pipe.incr(K_LATEST_VER)
-    new_ver = pipe.execute()[0]
-
-    pipe = r.pipeline()
-    pipe.set(K_WINDOW_VER.format(ver=new_ver), json.dumps(curr))
-    pipe.hset(K_WINDOW_META.format(ver=new_ver), mapping={"as_of": as_of.isoformat()})
-    pipe.execute()
-    return new_ver
-
-def load_window(version: int) -> List[Dict]:
-    if version <= 0: return []
-    raw = r.get(K_WINDOW_VER.format(ver=version))
-    return json.loads(raw) if raw else []
-
-def run_once():
-    as_of = dt.datetime.now(TZ).replace(microsecond=0)
-    dprint("Scraping trending window...")
-    curr = scrape_trending_topN(WINDOW_SIZE)
+    return state.snapshots.save(curr, as_of)
 
-    dprint("Saving window to Redis...")
-    new_ver = save_window(curr, as_of)
-    prev_ver = new_ver - 1
-    prev = load_window(prev_ver)
+def load_window(state: FeedState, version: int) -> List[Dict]:
+    return state.snapshots.load(version) or []
 
-    added, removed, moved = compute_diff(prev, curr, RANK_MOVE_THRESHOLD)
-    dprint(f"Diff v{prev_ver}→v{new_ver}: +{len(added)} / -{len(removed)} / moved:{len(moved)}")
-
-    for (k, new_rank) in added:
-        chain, contract = k
-        publish_token_change("ADDED", chain, contract, None, new_rank, new_ver, as_of)
-    for (k, old_rank) in removed:
-        chain, contract = k
-        publish_token_change("REMOVED", chain, contract, old_rank, None, new_ver, as_of)
-    for (k, old_rank, new_rank) in moved:
-        chain, contract = k
-        publish_token_change("MOVED", chain, contract, old_rank, new_rank, new_ver, as_of)
+def run_once(state: FeedState):
+    feed = state.feed
+    as_of = dt.datetime.now(TZ).replace(microsecond=0)
+    dprint(f"[{feed.name}] Scraping trending window...")
+    rows = scrape_trending_topN(state, feed.window + EXIT_MARGIN)
+    curr = rows[:feed.window]
+    # the page renders 100 rows, so the margin band is only as deep as the
+    # rows past the window that were actually returned
+    margin = min(EXIT_MARGIN, max(0, len(rows) - feed.window))
+    if margin < EXIT_MARGIN and not state.short_margin_logged:
+        state.short_margin_logged = True
+        dprint(f"[{feed.name}] Only {len(rows)} rows for window {feed.window} + margin {EXIT_MARGIN}; "
+               f"exit margin is {margin}, members below it leave after {EXIT_CYCLES} missed cycles")
+
+    if DB_WRITE:
+        write_tokens(state, curr)
+        record_history(state, curr, as_of)
+
+    dprint(f"[{feed.name}] Saving window to Redis...")
+    new_ver = save_window(state, curr, as_of)
+    prev_ver = new_ver - 1
+    if not state.diff.seeded:
+        state.diff.seed(load_window(state, prev_ver))
+
+    added, removed, moved = state.diff.update(rows, exit_margin=margin)
+    dprint(f"[{feed.name}] Diff v{prev_ver}→v{new_ver}: +{len(added)} / -{len(removed)} / moved:{len(moved)}")
+
+    events = []
+    for ((chain, contract), new_rank) in added:
+        events.append(token_change_payload(feed.name, "ADDED", chain, contract, None, new_rank, new_ver, as_of))
+    for ((chain, contract), old_rank) in removed:
+        events.append(token_change_payload(feed.name, "REMOVED", chain, contract, old_rank, None, new_ver, as_of))
+    for ((chain, contract), old_rank, new_rank) in moved:
+        events.append(token_change_payload(feed.name, "MOVED", chain, contract, old_rank, new_rank, new_ver, as_of))
+    publish_token_changes(state, events)
+
+def run_feed(state: FeedState):
+    """WorkerPool handler: one cycle of one feed."""
+    start = time.monotonic()
+    try:
+        run_once(state)
+    except Exception as e:
+        dprint(f"[{state.feed.name}] ERROR: {e}")
+    state.cycles += 1
+    state.last_run_s = time.monotonic() - start
 
 if __name__ == "__main__":
-    dprint("Trending extractor (Redis only) started.")
-    # Ensure version key exists
-    if not r.exists(K_LATEST_VER):
-        r.set(K_LATEST_VER, 0)
+    dprint(f"Trending extractor (Redis only) started: {FEEDS}")
+    for state in FEED_STATES:
+        # Ensure version key exists
+        if not r.exists(state.snapshots.k_latest):
+            r.set(state.snapshots.k_latest, 0)
+        # windows written before retention existed are never trimmed by save()
+        purged = state.snapshots.purge_unindexed()
+        if purged:
+            dprint(f"[{state.feed.name}] Purged {purged} stale snapshot keys")
 
     # initialize the SQL connection
     try:
-        sql_cursor.execute("CREATE DATABASE IF NOT EXISTS solana_tokens")
-        sql_cursor.execute("USE solana_tokens")
-        sql_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tokens (
-                contract VARCHAR(64) PRIMARY KEY,
-                chain VARCHAR(10),
-                name VARCHAR(255),
-                symbol VARCHAR(50),
-                market_cap DOUBLE,
-                liquidity DOUBLE,
-                volume DOUBLE,
-                thumbnail VARCHAR(255)
-            )
-                    """)
-        sqldb.commit()
+        ensure_database()
+        DB.run(ensure_tokens_table)
+        DB.run(lambda cur: ensure_token_metrics_table(cur, HISTORY_RETAIN_DAYS))
     except mysql.connector.Error as err:
         dprint(f"Error initializing MySQL: {err}")
         exit(1)
 
+    if any(not state.feed.api_url for state in FEED_STATES):
+        BROWSER_POOL.warm()
+
+    # one schedule entry per feed: a feed is handed to the workers when due;
+    # one that is still running is not queued twice (WorkerPool keys)
+    workers = WorkerPool(run_feed, workers=FEED_WORKERS, queue_size=len(FEED_STATES), name="feed")
+    next_due = {state.feed.name: 0.0 for state in FEED_STATES}
+    last_partition_check = last_stats = time.monotonic()
     while True:
-        try:
-            run_once()
-        except Exception as e:
-            dprint(f"ERROR: {e}")
-        # # small jitter
-        # sleep_s = INTERVAL_SEC + random.randint(-5, 5)
-        # time.sleep(60*5)
-        time.sleep(5)
+        now = time.monotonic()
+        for state in FEED_STATES:
+            name = state.feed.name
+            if now >= next_due[name] and workers.submit(state, key=name):
+                next_due[name] = now + state.feed.interval
+        if now - last_stats > 60:
+            last_stats = now
+            feeds = {s.feed.name: {"cycles": s.cycles, "last_run_s": round(s.last_run_s, 1)} for s in FEED_STATES}
+            dprint(f"Feeds: {feeds} | Workers: {workers.stats()} | Browser pool: {BROWSER_POOL.stats()} | "
+                   f"History sink: {HISTORY_SINK.stats()}")
+        # roll token_metrics day partitions forward / drop expired ones
+        if now - last_partition_check > 6 * 3600:
+            last_partition_check = now
+            try:
+                DB.run(lambda cur: ensure_token_metrics_table(cur, HISTORY_RETAIN_DAYS))
+            except (mysql.connector.Error, TimeoutError) as err:
+                dprint(f"Error maintaining token_metrics partitions: {err}")
+        time.sleep(max(0.2, min(1.0, min(next_due.values()) - time.monotonic())))
@@ -0,0 +1,54 @@
+# rate_limit.py
+# Per-domain token-bucket rate limiting shared by all threads of a process.
+import os
+import time
+import threading
+import urllib.parse
+from typing import Dict, Optional
+
+# requests/second per domain (0 = unlimited); burst = bucket capacity
+DOMAIN_RATES = {
+    "dexscreener.com": float(os.getenv("RATE_LIMIT_DEXSCREENER_RPS", "0.5")),
+    "dexcheck.ai": float(os.getenv("RATE_LIMIT_DEXCHECK_RPS", "1")),
+}
+DOMAIN_BURST = int(os.getenv("RATE_LIMIT_BURST", "2"))
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class DomainRateLimiter:
+    """Maps a URL to its domain's bucket; unknown domains are not limited."""
+
+    def __init__(self, rates: Dict[str, float] = DOMAIN_RATES, burst: int = DOMAIN_BURST):
+        self._buckets = {d: TokenBucket(rps, burst) for d, rps in rates.items() if rps > 0}
+
+    def _bucket_for(self, url: str) -> Optional[TokenBucket]:
+        host = (urllib.parse.urlparse(url).hostname or "").lower()
+        for domain, bucket in self._buckets.items():
+            if host == domain or host.endswith("." + domain):
+                return bucket
+        return None
+
+    def acquire(self, url: str) -> float:
+        bucket = self._bucket_for(url)
+        return bucket.acquire() if bucket else 0.0
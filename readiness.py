@@ -0,0 +1,198 @@
+# readiness.py
+# Page readiness for the SB scrapers: poll for a page type's ready selector
+# instead of fixed sleeps, and derive each page type's timeout from the load
+# times actually observed (p99 x margin) instead of a flat 100 s.
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+from session_store import ClearanceStore, challenge_present
+
+# ready selectors per page type; override any of them with
+# SCRAPER_SELECTORS='{"pair": "div.some-new-class"}' (JSON string or file path)
+DEFAULT_SELECTORS = {
+    "trending": "img.ds-dex-table-row-token-icon-img",
+    "pair": "div.custom-1oq7u8k",
+    "top_traders_button": 'button:contains("Top Traders")',
+    "top_traders": "a.custom-1hhf88o",
+    "wallet": "img.bg-brand-background-highlight",
+    "token_info": "header h2.chakra-heading",
+}
+
+def load_selectors() -> Dict[str, str]:
+    selectors = dict(DEFAULT_SELECTORS)
+    raw = os.getenv("SCRAPER_SELECTORS", "").strip()
+    if raw:
+        if not raw.startswith("{"):
+            with open(raw) as f:
+                raw = f.read()
+        selectors.update(json.loads(raw))
+    return selectors
+
+SELECTORS = load_selectors()
+
+CAPTCHA_AFTER = float(os.getenv("READINESS_CAPTCHA_AFTER", "3"))      # try the challenge click once after this
+CHALLENGE_CLEAR = float(os.getenv("READINESS_CHALLENGE_CLEAR", "15"))  # seconds a clicked challenge takes to clear
+# never below the time a challenged page needs, however fast clean loads are
+MIN_TIMEOUT = max(float(os.getenv("READINESS_MIN_TIMEOUT", "20")), CAPTCHA_AFTER + CHALLENGE_CLEAR)
+MAX_TIMEOUT = float(os.getenv("READINESS_MAX_TIMEOUT", "100"))
+DEFAULT_TIMEOUT = float(os.getenv("READINESS_DEFAULT_TIMEOUT", "60"))   # until enough samples exist
+# page types with their own default; it is also their floor, e.g. the token
+# info page is parsed whether or not it became ready, so waiting long on a bad
+# contract only holds a request thread and a browser
+DEFAULT_TIMEOUTS = {
+    "token_info": float(os.getenv("READINESS_TOKEN_INFO_TIMEOUT", "8")),
+}
+P99_MARGIN = float(os.getenv("READINESS_P99_MARGIN", "1.5"))
+MIN_SAMPLES = int(os.getenv("READINESS_MIN_SAMPLES", "20"))
+WINDOW = int(os.getenv("READINESS_WINDOW", "500"))                   # samples kept per page type
+WIDEN_SECONDS = float(os.getenv("READINESS_WIDEN_SECONDS", "300"))   # how long a timeout widens the next ones
+POLL_INTERVAL = 0.2
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+class Readiness:
+    """
+    `wait(sb, page_type)` polls the page type's selector, tries the
+    Cloudflare click once if the page is still not ready after
+    `captcha_after` seconds, records how long the page took and raises
+    TimeoutError after `timeout(page_type)`. Load times are kept per page
+    type (and mirrored to Redis when a client is given, so new processes
+    start with the history of earlier ones). With a ClearanceStore, a
+    challenge seen while waiting is counted and the clearance of a page
+    that became ready is saved for other browsers.
+    """
+
+    def __init__(self, r=None, selectors: Optional[Dict[str, str]] = None, window: int = WINDOW,
+                 sessions: Optional[ClearanceStore] = None, widen_seconds: float = WIDEN_SECONDS):
+        self.r = r
+        self.sessions = sessions
+        self.selectors = selectors or SELECTORS
+        self.window = window
+        self.widen_seconds = widen_seconds
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._widened_until: Dict[str, float] = {}
+
+    def _key(self, page_type: str) -> str:
+        return f"readiness:samples:{page_type}"
+
+    def _series(self, page_type: str) -> deque:
+        with self._lock:
+            series = self._samples.get(page_type)
+            if series is not None:
+                return series
+            series = self._samples[page_type] = deque(maxlen=self.window)
+        if self.r is not None:
+            try:
+                series.extend(float(v) for v in reversed(self.r.lrange(self._key(page_type), 0, self.window - 1)))
+            except Exception:
+                pass   # learning starts from scratch without Redis
+        return series
+
+    def record(self, page_type: str, seconds: float):
+        self._series(page_type).append(seconds)
+        if self.r is not None:
+            try:
+                pipe = self.r.pipeline(transaction=False)
+                pipe.lpush(self._key(page_type), round(seconds, 3))
+                pipe.ltrim(self._key(page_type), 0, self.window - 1)
+                pipe.execute()
+            except Exception:
+                pass
+
+    def record_timeout(self, page_type: str):
+        with self._lock:
+            self._timeouts[page_type] = self._timeouts.get(page_type, 0) + 1
+            self._widened_until[page_type] = time.monotonic() + self.widen_seconds
+
+    def timeout(self, page_type: str) -> float:
+        default = DEFAULT_TIMEOUTS.get(page_type, DEFAULT_TIMEOUT)
+        series = sorted(self._series(page_type))
+        if len(series) < MIN_SAMPLES:
+            return default
+        timeout = max(min(MIN_TIMEOUT, default), _percentile(series, 0.99) * P99_MARGIN)
+        if time.monotonic() < self._widened_until.get(page_type, 0):
+            timeout *= P99_MARGIN
+        return min(MAX_TIMEOUT, timeout)
+
+    def selector(self, page_type: str) -> str:
+        return self.selectors[page_type]
+
+    def wait(self, sb, page_type: str, selector: Optional[str] = None, captcha: bool = True,
+             timeout: Optional[float] = None, started: Optional[float] = None) -> float:
+        """Block until the page is ready; returns the seconds it took since `started` (default: now)."""
+        selector = selector or self.selector(page_type)
+        timeout = timeout or self.timeout(page_type)
+        start = started or time.monotonic()
+        clicked = not captcha
+        while True:
+            elapsed = time.monotonic() - start
+            try:
+                if sb.is_element_visible(selector):
+                    self.record(page_type, elapsed)
+                    if self.sessions:
+                        self._save_session(sb)
+                    return elapsed
+            except Exception:
+                pass   # page mid-navigation
+            if elapsed > timeout:
+                self.record_timeout(page_type)
+                raise TimeoutError(f"{page_type}: {selector} not visible after {timeout:.1f}s")
+            if not clicked and elapsed > CAPTCHA_AFTER:
+                clicked = True
+                if self.sessions and challenge_present(sb):
+                    try: self.sessions.challenged(sb.get_current_url())
+                    except Exception: pass
+                try: sb.uc_gui_click_captcha()
+                except Exception: pass
+            time.sleep(POLL_INTERVAL)
+
+    def _save_session(self, sb):
+        try:
+            self.sessions.save_if_missing(sb.cdp, sb.get_current_url())
+        except Exception:
+            pass   # the page is ready either way
+
+    def stats(self) -> Dict:
+        out = {}
+        for page_type in list(self._samples):
+            series = sorted(self._series(page_type))
+            out[page_type] = {
+                "samples": len(series),
+                "p50": round(_percentile(series, 0.5), 2),
+                "p99": round(_percentile(series, 0.99), 2),
+                "timeout": round(self.timeout(page_type), 1),
+                "timeouts": self._timeouts.get(page_type, 0),
+            }
+        return out
+
+def simulate(loads: int = 2000, dead_every: int = 20, load_seconds: float = 4.0) -> float:
+    """
+    Feed `loads` page loads of ~`load_seconds` through a Readiness, every
+    `dead_every`-th one a dead page that runs into the timeout; returns the
+    highest timeout handed out (it must stay well below MAX_TIMEOUT).
+    """
+    readiness, page_type, worst = Readiness(), "sim", 0.0
+    for i in range(loads):
+        timeout = readiness.timeout(page_type)
+        if i >= 2 * MIN_SAMPLES:   # past DEFAULT_TIMEOUT
+            worst = max(worst, timeout)
+        if i % dead_every == dead_every - 1:
+            readiness.record_timeout(page_type)
+        else:
+            readiness.record(page_type, load_seconds * (0.5 + (i * 7919 % 100) / 100))
+    return worst
+
+if __name__ == "__main__":
+    # python readiness.py: check that a steady stream of dead pages doesn't pin the timeout at MAX
+    worst = simulate()
+    print(f"highest timeout with 5% dead pages: {worst:.1f}s (min {MIN_TIMEOUT:g}s, max {MAX_TIMEOUT:g}s)")
+    raise SystemExit(0 if worst < MAX_TIMEOUT else 1)
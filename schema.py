@@ -0,0 +1,239 @@
+# schema.py
+# MySQL table definitions shared by the extractors and the API. Everything is
+# idempotent so each service can run it on startup.
+import time
+from typing import Dict
+
+TOKENS_DDL = """
+    CREATE TABLE IF NOT EXISTS tokens (
+        contract VARCHAR(64) PRIMARY KEY,
+        chain VARCHAR(10),
+        name VARCHAR(255),
+        symbol VARCHAR(50),
+        market_cap DOUBLE,
+        liquidity DOUBLE,
+        volume DOUBLE,
+        thumbnail VARCHAR(255),
+        logo_url VARCHAR(512),
+        pair_address VARCHAR(64),
+        audit TINYINT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+# columns added after the table first shipped; ALTERed onto older tables
+TOKENS_ADDED_COLUMNS = {
+    "logo_url": "VARCHAR(512)",
+    "pair_address": "VARCHAR(64)",
+    "audit": "TINYINT NULL",   # NULL until a token-info scrape has run
+    "updated_at": "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+}
+
+def ensure_columns(cursor, table: str, columns: Dict[str, str]):
+    """ADD any missing columns (MySQL 8 has no ADD COLUMN IF NOT EXISTS)."""
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+    existing = {row[0].lower() for row in cursor.fetchall()}
+    for name, ddl in columns.items():
+        if name.lower() not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+def ensure_tokens_table(cursor):
+    cursor.execute(TOKENS_DDL)
+    ensure_columns(cursor, "tokens", TOKENS_ADDED_COLUMNS)
+
+# append-only per-cycle token metrics (token_history.py); one partition per UTC
+# day so retention is a DROP PARTITION instead of a large DELETE. `feed` is the
+# trending feed (feeds.py) the rank belongs to; rows written before feeds
+# existed belong to the original solana feed
+TOKEN_METRICS_DDL = """
+    CREATE TABLE IF NOT EXISTS token_metrics (
+        contract VARCHAR(64) NOT NULL,
+        feed VARCHAR(64) NOT NULL DEFAULT 'solana-trendingScoreH24',
+        ts INT UNSIGNED NOT NULL,
+        chain VARCHAR(10) NOT NULL,
+        trend_rank SMALLINT UNSIGNED,
+        market_cap DOUBLE,
+        liquidity DOUBLE,
+        volume DOUBLE,
+        PRIMARY KEY (contract, feed, ts)
+    )
+    PARTITION BY RANGE (ts) (PARTITION pmax VALUES LESS THAN MAXVALUE)
+"""
+
+def ensure_token_metrics_table(cursor, retain_days: int = 0, days_ahead: int = 3):
+    cursor.execute(TOKEN_METRICS_DDL)
+    cursor.execute(
+        "SELECT 1 FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'token_metrics' AND COLUMN_NAME = 'feed'")
+    if not cursor.fetchall():
+        # tables from before feeds: one ALTER adds the column and widens the key
+        cursor.execute(
+            "ALTER TABLE token_metrics "
+            "ADD COLUMN feed VARCHAR(64) NOT NULL DEFAULT 'solana-trendingScoreH24' AFTER contract, "
+            "DROP PRIMARY KEY, ADD PRIMARY KEY (contract, feed, ts)")
+    ensure_day_partitions(cursor, "token_metrics", retain_days, days_ahead)
+
+def ensure_day_partitions(cursor, table: str, retain_days: int = 0, days_ahead: int = 3):
+    """
+    Split `pmax` into daily partitions up to `days_ahead` days from today and
+    drop the ones entirely older than `retain_days` (0 keeps everything).
+    Run at startup and about once a day.
+    """
+    cursor.execute(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL",
+        (table,))
+    bounds = {name: desc for name, desc in cursor.fetchall()}
+    if "pmax" not in bounds:
+        return   # not partitioned the way this function manages
+    day_bounds = {name: int(desc) for name, desc in bounds.items() if name != "pmax"}
+
+    today = int(time.time()) // 86400 * 86400
+    last = max(day_bounds.values(), default=today)   # upper bound of the newest day partition
+    new = []
+    while last < today + (days_ahead + 1) * 86400:
+        start = last
+        last = start + 86400
+        day = time.strftime("%Y%m%d", time.gmtime(start))
+        new.append(f"PARTITION p{day} VALUES LESS THAN ({last})")
+    if new:
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO "
+                       f"({', '.join(new)}, PARTITION pmax VALUES LESS THAN MAXVALUE)")
+
+    if retain_days > 0:
+        cutoff = today - retain_days * 86400
+        expired = [name for name, upper in day_bounds.items() if upper <= cutoff]
+        if expired:
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+
+# one row per wallet with its latest dexcheck stats (wallet_store.py)
+WALLETS_DDL = """
+    CREATE TABLE IF NOT EXISTS wallets (
+        wallet_address VARCHAR(44) PRIMARY KEY,
+        gross_profit DECIMAL(20, 2),
+        realized_profit DECIMAL(20, 2),
+        realized_profit_percent DECIMAL(12, 2),
+        unrealized_profit DECIMAL(20, 2),
+        unrealized_profit_percent DECIMAL(12, 2),
+        win_rate DECIMAL(5, 2),
+        wins INT,
+        losses INT,
+        trade_volume DECIMAL(20, 2),
+        trades INT,
+        avg_trade_size DECIMAL(20, 2),
+        is_bot BOOLEAN,
+        stats_hash CHAR(40) NOT NULL,
+        first_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        stats_changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_wallets_win_rate (is_bot, win_rate),
+        INDEX idx_wallets_gross_profit (is_bot, gross_profit)
+    )
+"""
+
+# a wallet's stats each time it was seen trading a token, only when they changed
+WALLET_OBSERVATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS wallet_observations (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        wallet_address VARCHAR(44) NOT NULL,
+        token_address VARCHAR(64) NOT NULL,
+        observed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        stats_hash CHAR(40) NOT NULL,
+        gross_profit DECIMAL(20, 2),
+        realized_profit DECIMAL(20, 2),
+        realized_profit_percent DECIMAL(12, 2),
+        unrealized_profit DECIMAL(20, 2),
+        unrealized_profit_percent DECIMAL(12, 2),
+        win_rate DECIMAL(5, 2),
+        wins INT,
+        losses INT,
+        trade_volume DECIMAL(20, 2),
+        trades INT,
+        avg_trade_size DECIMAL(20, 2),
+        is_bot BOOLEAN,
+        INDEX idx_observations_pair (wallet_address, token_address, id),
+        INDEX idx_observations_token (token_address, observed_at),
+        INDEX idx_observations_wallet (wallet_address, observed_at)
+    )
+"""
+
+def ensure_wallet_tables(cursor):
+    cursor.execute(WALLETS_DDL)
+    cursor.execute(WALLET_OBSERVATIONS_DDL)
+    # the first version deduped on UNIQUE (wallet, token, stats_hash), which
+    # also swallowed stats that changed back to an earlier value
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'wallet_observations' "
+        "AND INDEX_NAME = 'uq_observation' LIMIT 1")
+    if cursor.fetchone() is not None:
+        cursor.execute("ALTER TABLE wallet_observations DROP INDEX uq_observation, "
+                       "ADD INDEX idx_observations_pair (wallet_address, token_address, id)")
+
+def table_exists(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,))
+    return cursor.fetchone() is not None
+
+# wallets currently passing the leaderboard thresholds (leaderboard.py)
+WELL_PERFORMED_DDL = """
+    CREATE TABLE IF NOT EXISTS well_performed (
+        wallet_address VARCHAR(44) PRIMARY KEY,
+        token_address VARCHAR(64),
+        gross_profit DECIMAL(20, 2),
+        realized_profit DECIMAL(20, 2),
+        realized_profit_percent DECIMAL(12, 2),
+        unrealized_profit DECIMAL(20, 2),
+        unrealized_profit_percent DECIMAL(12, 2),
+        win_rate DECIMAL(5, 2),
+        wins INT,
+        losses INT,
+        trade_volume DECIMAL(20, 2),
+        trades INT,
+        avg_trade_size DECIMAL(20, 2),
+        is_bot BOOLEAN,
+        qualified_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_well_performed_gross_profit (gross_profit),
+        INDEX idx_well_performed_win_rate (win_rate)
+    )
+"""
+
+# what a table from the old `CREATE TABLE well_performed LIKE traders` script
+# lacks: the timestamps, wider types and the leaderboard indexes
+WELL_PERFORMED_ADDED_COLUMNS = {
+    "qualified_at": "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+    "updated_at": "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+}
+WELL_PERFORMED_WIDENED_COLUMNS = {
+    "token_address": ("VARCHAR(64)", "CHARACTER_MAXIMUM_LENGTH", 64),
+    "realized_profit_percent": ("DECIMAL(12, 2)", "NUMERIC_PRECISION", 12),
+    "unrealized_profit_percent": ("DECIMAL(12, 2)", "NUMERIC_PRECISION", 12),
+}
+WELL_PERFORMED_INDEXES = {
+    "idx_well_performed_gross_profit": "gross_profit",
+    "idx_well_performed_win_rate": "win_rate",
+}
+
+def ensure_leaderboard_table(cursor):
+    cursor.execute(WELL_PERFORMED_DDL)
+    ensure_columns(cursor, "well_performed", WELL_PERFORMED_ADDED_COLUMNS)
+    cursor.execute(
+        "SELECT COLUMN_NAME, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'well_performed'")
+    sizes = {row[0].lower(): {"CHARACTER_MAXIMUM_LENGTH": row[1], "NUMERIC_PRECISION": row[2]}
+             for row in cursor.fetchall()}
+    changes = [f"MODIFY COLUMN {name} {ddl}"
+               for name, (ddl, attr, size) in WELL_PERFORMED_WIDENED_COLUMNS.items()
+               if name in sizes and (sizes[name][attr] or 0) < size]
+    cursor.execute(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'well_performed'")
+    indexes = {row[0].lower() for row in cursor.fetchall()}
+    changes += [f"ADD INDEX {name} ({column})"
+                for name, column in WELL_PERFORMED_INDEXES.items() if name not in indexes]
+    if changes:
+        cursor.execute(f"ALTER TABLE well_performed {', '.join(changes)}")
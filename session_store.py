@@ -0,0 +1,165 @@
+# session_store.py
+# Cloudflare clearance reuse: after a browser gets through a challenge, its
+# cookies (cf_clearance & co.) are saved per domain in Redis so new or
+# recycled browsers start with them instead of solving the challenge again.
+import os
+import json
+import time
+import threading
+import urllib.parse
+from typing import Dict, Optional
+
+CLEARANCE_MAX_AGE = int(os.getenv("CLEARANCE_MAX_AGE", "1800"))   # seconds a saved state is trusted
+CLEARANCE_COOKIE = "cf_clearance"
+CHALLENGE_SELECTOR = 'iframe[src*="challenges.cloudflare.com"], #challenge-form'
+CHALLENGE_TITLES = ("just a moment", "attention required")
+
+# the fields Network.setCookies accepts (get_all returns a few more)
+COOKIE_PARAM_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite",
+                       "expires", "priority", "sourceScheme", "sourcePort", "partitionKey")
+
+def site_of(url: str) -> str:
+    """dexscreener.com for https://www.dexscreener.com/solana/..."""
+    host = (urllib.parse.urlparse(url).hostname or "").lower()
+    return ".".join(host.split(".")[-2:])
+
+def challenge_present(page) -> bool:
+    """`page` is sb or sb.cdp: a Cloudflare interstitial is showing."""
+    try:
+        if any(t in (page.get_title() or "").lower() for t in CHALLENGE_TITLES):
+            return True
+        return page.is_element_present(CHALLENGE_SELECTOR)
+    except Exception:
+        return False
+
+class _CookieParam:
+    # nodriver's cookies.set_all() only needs objects with to_json()
+    def __init__(self, data: Dict):
+        self.data = data
+
+    def to_json(self) -> Dict:
+        return self.data
+
+def _cookie_json(cookie) -> Dict:
+    data = cookie.to_json() if hasattr(cookie, "to_json") else dict(cookie)
+    out = {k: data[k] for k in COOKIE_PARAM_FIELDS if data.get(k) is not None}
+    if data.get("session") or out.get("expires", 0) <= 0:
+        out.pop("expires", None)
+    return out
+
+class ClearanceStore:
+    """
+    Keys under `clearance`:
+      :<site>                       JSON {cookies, user_agent, saved_at, expires_at}, TTL = expiry
+      :challenges:<site>:<hour>     challenges seen in that hour (kept 2 days)
+      :domains                      sites that ever had state or a challenge
+    A saved state expires at the cf_clearance cookie's expiry or after
+    `max_age`, whichever is first. A challenge despite saved state drops
+    that state; the next successful pass saves a fresh one.
+    """
+
+    def __init__(self, r, prefix: str = "clearance", max_age: int = CLEARANCE_MAX_AGE):
+        self.r = r
+        self.prefix = prefix
+        self.max_age = max_age
+        self.k_domains = f"{prefix}:domains"
+        self._lock = threading.Lock()
+        self._loads = 0
+        self._saves = 0
+
+    def _key(self, site: str) -> str:
+        return f"{self.prefix}:{site}"
+
+    def _challenge_key(self, site: str, hour: int) -> str:
+        return f"{self.prefix}:challenges:{site}:{hour}"
+
+    def get(self, site: str) -> Optional[Dict]:
+        raw = self.r.get(self._key(site))
+        if not raw:
+            return None
+        state = json.loads(raw)
+        return state if state["expires_at"] > time.time() else None
+
+    def save(self, cdp, url: str) -> bool:
+        """Store the browser's cookies for `url`'s site; False if it has no clearance cookie."""
+        site = site_of(url)
+        cookies = [_cookie_json(c) for c in cdp.get_all_cookies()]
+        cookies = [c for c in cookies if c.get("domain", "").lstrip(".").endswith(site)]
+        clearance = [c for c in cookies if c["name"] == CLEARANCE_COOKIE]
+        if not clearance:
+            return False
+        now = time.time()
+        expires_at = now + self.max_age
+        if clearance[0].get("expires"):
+            expires_at = min(expires_at, clearance[0]["expires"])
+        if expires_at <= now:
+            return False
+        try:
+            user_agent = cdp.get_user_agent()
+        except Exception:
+            user_agent = None
+        state = {"cookies": cookies, "user_agent": user_agent, "saved_at": now, "expires_at": expires_at}
+        pipe = self.r.pipeline()
+        pipe.set(self._key(site), json.dumps(state), ex=max(1, int(expires_at - now)))
+        pipe.sadd(self.k_domains, site)
+        pipe.execute()
+        with self._lock:
+            self._saves += 1
+        return True
+
+    def save_if_missing(self, cdp, url: str) -> bool:
+        """`save()` unless the site already has valid state (called after every ready page)."""
+        if self.get(site_of(url)):
+            return False
+        return self.save(cdp, url)
+
+    def apply(self, cdp, url: str, newer_than: Optional[float] = None) -> Optional[float]:
+        """
+        Load the saved state for `url`'s site into the browser unless it is
+        not newer than `newer_than`; returns the loaded state's saved_at.
+        """
+        state = self.get(site_of(url))
+        if not state or (newer_than is not None and state["saved_at"] <= newer_than):
+            return None
+        if state.get("user_agent"):
+            # clearance is bound to the user agent that solved it
+            try:
+                if cdp.get_user_agent() != state["user_agent"]:
+                    return None
+            except Exception:
+                pass
+        cdp.set_all_cookies([_CookieParam(c) for c in state["cookies"]])
+        with self._lock:
+            self._loads += 1
+        return state["saved_at"]
+
+    def challenged(self, url: str):
+        """Count a challenge on `url`'s site; saved state that didn't prevent it is dropped."""
+        site = site_of(url)
+        key = self._challenge_key(site, int(time.time() // 3600))
+        pipe = self.r.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, 2 * 86400)
+        pipe.sadd(self.k_domains, site)
+        pipe.delete(self._key(site))
+        pipe.execute()
+
+    def challenges_per_hour(self, site: str) -> Dict[str, int]:
+        hour = int(time.time() // 3600)
+        current, previous = self.r.mget(self._challenge_key(site, hour), self._challenge_key(site, hour - 1))
+        return {"this_hour": int(current or 0), "last_hour": int(previous or 0)}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = {"loads": self._loads, "saves": self._saves, "domains": {}}
+        try:
+            for site in sorted(self.r.smembers(self.k_domains)):
+                site = site.decode() if isinstance(site, bytes) else site
+                state = self.get(site)
+                out["domains"][site] = {
+                    "challenges": self.challenges_per_hour(site),
+                    "expires_in": round(state["expires_at"] - time.time()) if state else None,
+                }
+        except Exception as e:
+            out["error"] = str(e)
+        return out
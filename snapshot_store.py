@@ -0,0 +1,326 @@
+# snapshot_store.py
+# Versioned trending-window snapshots in Redis, stored compactly and trimmed
+# so memory stays flat however long the extractor runs.
+import os
+import json
+import time
+import zlib
+import threading
+from typing import Dict, List, Optional, Tuple
+import redis
+from extractors import parse_num
+
+SNAPSHOT_RETAIN_COUNT = int(os.getenv("SNAPSHOT_RETAIN_COUNT", "120"))       # newest versions kept
+SNAPSHOT_RETAIN_SECONDS = int(os.getenv("SNAPSHOT_RETAIN_SECONDS", "3600"))  # 0 = no age limit
+SNAPSHOT_DELTA = os.getenv("SNAPSHOT_DELTA", "1") == "1"
+SNAPSHOT_KEYFRAME_EVERY = int(os.getenv("SNAPSHOT_KEYFRAME_EVERY", "20"))   # full snapshot every N versions
+
+FORMAT = 1
+MAGIC = b"Z1"   # zlib-compressed compact JSON; anything else is a legacy JSON array
+
+# per-row columns; rank, chain, link and the parsed numbers are derived on load
+COLUMNS = ("contract", "name", "symbol", "market_cap_raw", "liquidity_raw", "volume_raw", "thumbnail")
+NUMERIC = (("market_cap", "market_cap_raw"), ("liquidity", "liquidity_raw"), ("volume", "volume_raw"))
+DERIVED = {"chain", "rank", "link"} | {parsed for parsed, _ in NUMERIC}
+
+def _row_key(row: Dict) -> list:
+    extra = {k: v for k, v in row.items() if k not in DERIVED and k not in COLUMNS}
+    return [row.get(c) for c in COLUMNS] + ([extra] if extra else [])
+
+def compact_rows(rows: List[Dict]) -> Tuple[Dict, List[list]]:
+    """(header, per-row column lists) for `rows` in rank order."""
+    chain = rows[0]["chain"] if rows else None
+    link_prefix = None
+    if rows and rows[0].get("link", "").endswith(rows[0]["contract"]):
+        link_prefix = rows[0]["link"][:-len(rows[0]["contract"])]
+    compact = []
+    for row in rows:
+        key = _row_key(row)
+        # keep fields the header can't rebuild
+        if row.get("chain") != chain or (link_prefix is not None and row.get("link") != link_prefix + row["contract"]):
+            extra = key[-1] if len(key) > len(COLUMNS) else {}
+            key = key[:len(COLUMNS)] + [dict(extra, chain=row.get("chain"), link=row.get("link"))]
+        compact.append(key)
+    return {"chain": chain, "link": link_prefix}, compact
+
+def encode_snapshot(header: Dict, compact: List[list], base: Optional[Tuple[int, List[list]]] = None) -> bytes:
+    """
+    With `base` = (version, compact rows of that version), rows identical to
+    one in the base are stored as its index.
+    """
+    doc = {"f": FORMAT, **header}
+    if base is not None:
+        base_ver, base_rows = base
+        index = {json.dumps(r, sort_keys=True): i for i, r in enumerate(base_rows)}
+        doc["base"] = base_ver
+        doc["rows"] = [index.get(json.dumps(r, sort_keys=True), r) for r in compact]
+    else:
+        doc["rows"] = compact
+    return MAGIC + zlib.compress(json.dumps(doc, separators=(",", ":")).encode(), 6)
+
+def decode_doc(blob: bytes) -> Dict:
+    if blob[:len(MAGIC)] == MAGIC:
+        return json.loads(zlib.decompress(blob[len(MAGIC):]))
+    # snapshots written before this store: a plain JSON array of row dicts
+    return {"legacy": json.loads(blob)}
+
+def expand_rows(doc: Dict, compact: List[list]) -> List[Dict]:
+    out = []
+    for rank, values in enumerate(compact, start=1):
+        row = {"chain": doc["chain"], "rank": rank}
+        row.update(zip(COLUMNS, values))
+        if doc.get("link") is not None:
+            row["link"] = doc["link"] + row["contract"]
+        for parsed, raw in NUMERIC:
+            row[parsed] = parse_num(row.get(raw))
+        if len(values) > len(COLUMNS):
+            row.update(values[-1])
+        out.append(row)
+    return out
+
+# KEYS: latest_version, versions zset, saved channel
+# ARGV: prefix, blob, as_of, rows, base version (0 = keyframe), now, retain_count, retain_seconds
+# Window keys are built from the prefix, so this needs a single (non-cluster) Redis.
+SAVE_LUA = """
+local prefix = ARGV[1]
+local ver = redis.call('INCR', KEYS[1])
+local wkey = prefix .. ':window:' .. ver
+redis.call('SET', wkey, ARGV[2])
+redis.call('HSET', wkey .. ':meta', 'as_of', ARGV[3], 'rows', ARGV[4],
+           'bytes', string.len(ARGV[2]), 'base', ARGV[5])
+redis.call('ZADD', KEYS[2], ARGV[6], ver)
+
+local keep_from = ver - tonumber(ARGV[7]) + 1
+local retain_seconds = tonumber(ARGV[8])
+if retain_seconds > 0 then
+  local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[6]) - retain_seconds)
+  if #expired > 0 then
+    keep_from = math.max(keep_from, tonumber(expired[#expired]) + 1)
+  end
+end
+keep_from = math.min(keep_from, ver)
+-- keep every version the oldest retained delta is built on
+local base = tonumber(redis.call('HGET', prefix .. ':window:' .. keep_from .. ':meta', 'base') or '0')
+while base and base > 0 and base < keep_from do
+  keep_from = base
+  base = tonumber(redis.call('HGET', prefix .. ':window:' .. keep_from .. ':meta', 'base') or '0')
+end
+
+local dropped = 0
+for _, v in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+  if tonumber(v) < keep_from then
+    redis.call('DEL', prefix .. ':window:' .. v, prefix .. ':window:' .. v .. ':meta')
+    redis.call('ZREM', KEYS[2], v)
+    dropped = dropped + 1
+  end
+end
+redis.call('PUBLISH', KEYS[3], ver)
+return {ver, dropped}
+"""
+
+# KEYS: latest_version
+# ARGV: prefix, max chain length, version (0 = latest)
+# Returns {version, v1, blob1, v2, blob2, ...}: the snapshot and the bases it needs.
+READ_LUA = """
+local prefix = ARGV[1]
+local ver = tonumber(ARGV[3])
+if ver <= 0 then ver = tonumber(redis.call('GET', KEYS[1]) or '0') end
+local out = {ver}
+local v = ver
+for i = 1, tonumber(ARGV[2]) do
+  if v <= 0 then break end
+  local blob = redis.call('GET', prefix .. ':window:' .. v)
+  if not blob then break end
+  table.insert(out, v)
+  table.insert(out, blob)
+  v = tonumber(redis.call('HGET', prefix .. ':window:' .. v .. ':meta', 'base') or '0')
+end
+return out
+"""
+
+class SnapshotStore:
+    """
+    Keys under `<prefix>`:
+      :latest_version        string int
+      :window:{ver}          encoded snapshot (binary; needs a client without decode_responses)
+      :window:{ver}:meta     hash: as_of, rows, bytes, base
+      :versions              zset version -> unix time written, drives retention
+      :saved                 pub/sub channel, the new version is published after every save
+    Versions older than `retain_count` newest or `retain_seconds` are deleted
+    on every save. Delta snapshots reference the previous version, and a full
+    keyframe is written every `keyframe_every` versions so chains stay short;
+    trimming never removes a base that a retained delta still needs.
+    Writes and reads are Lua scripts, so each is one atomic round-trip.
+    """
+
+    def __init__(self, r, prefix: str = "trending", retain_count: int = SNAPSHOT_RETAIN_COUNT,
+                 retain_seconds: int = SNAPSHOT_RETAIN_SECONDS, delta: bool = SNAPSHOT_DELTA,
+                 keyframe_every: int = SNAPSHOT_KEYFRAME_EVERY):
+        self.r = r
+        self.prefix = prefix
+        self.k_latest = f"{prefix}:latest_version"
+        self.k_window = f"{prefix}:window:{{ver}}"
+        self.k_meta = f"{prefix}:window:{{ver}}:meta"
+        self.k_versions = f"{prefix}:versions"
+        self.k_saved = f"{prefix}:saved"
+        self.retain_count = max(1, retain_count)
+        self.retain_seconds = retain_seconds
+        self.delta = delta
+        self.keyframe_every = max(1, keyframe_every)
+        # (version, compact rows) of the last save, the base for the next delta
+        self._last: Optional[Tuple[int, List[list]]] = None
+        self._deltas = 0   # deltas written since the last keyframe
+        self._save_script = r.register_script(SAVE_LUA)
+        self._read_script = r.register_script(READ_LUA)
+
+    def latest_version(self) -> int:
+        v = self.r.get(self.k_latest)
+        return int(v) if v else 0
+
+    def save(self, rows: List[Dict], as_of) -> int:
+        """
+        Bump the version, store snapshot + meta and trim old versions in one
+        atomic script call; readers never see a version without its snapshot.
+        """
+        base = None
+        if self.delta and self._last and self._deltas < self.keyframe_every - 1:
+            base = self._last
+        header, compact = compact_rows(rows)
+        blob = encode_snapshot(header, compact, base)
+        ver, dropped = self._save_script(
+            keys=[self.k_latest, self.k_versions, self.k_saved],
+            args=[self.prefix, blob, as_of.isoformat(), len(rows), base[0] if base else 0,
+                  time.time(), self.retain_count, self.retain_seconds])
+        ver = int(ver)
+        self._last = (ver, compact)
+        self._deltas = self._deltas + 1 if base else 0
+        return ver
+
+    def purge_unindexed(self) -> int:
+        """Delete snapshots that predate the versions index (written before retention existed)."""
+        indexed = {int(v) for v in self.r.zrange(self.k_versions, 0, -1)}
+        # the latest legacy snapshot stays readable until a new one is saved
+        keep_from = min(indexed | {self.latest_version()})
+        removed = 0
+        pattern = self.k_window.format(ver="*")
+        for key in self.r.scan_iter(match=pattern, count=1000):
+            key = key.decode() if isinstance(key, bytes) else key
+            part = key[len(pattern) - 1:].split(":", 1)[0]
+            if part.isdigit() and int(part) < keep_from and int(part) not in indexed:
+                removed += self.r.delete(key)
+        return removed
+
+    def _read(self, ver: int) -> Tuple[int, Dict[int, bytes]]:
+        """(version, {version: blob} for it and the versions its delta chain needs)."""
+        resp = self._read_script(keys=[self.k_latest],
+                                 args=[self.prefix, self.keyframe_every + 1, ver])
+        blobs = {int(resp[i]): resp[i + 1] for i in range(1, len(resp) - 1, 2)}
+        return int(resp[0]), blobs
+
+    def _resolve(self, ver: int, blobs: Dict[int, bytes]) -> Optional[Tuple[Dict, List]]:
+        chain = []
+        while ver in blobs:
+            doc = decode_doc(blobs[ver])
+            chain.append(doc)
+            if "base" not in doc:
+                break
+            ver = doc["base"]
+        else:
+            return None   # a base in the chain is gone
+        if "legacy" in chain[-1]:
+            return (chain[0], chain[0]["legacy"]) if len(chain) == 1 else None
+        rows = chain[-1]["rows"]
+        for doc in reversed(chain[:-1]):
+            rows = [rows[r] if isinstance(r, int) else r for r in doc["rows"]]
+        return chain[0], rows
+
+    def _load(self, ver: int) -> Tuple[int, Optional[List[Dict]]]:
+        ver, blobs = self._read(ver)
+        if ver <= 0:
+            return ver, None
+        loaded = self._resolve(ver, blobs)
+        if loaded is None:
+            return ver, None
+        doc, rows = loaded
+        if "legacy" in doc:
+            return ver, rows
+        return ver, expand_rows(doc, rows)
+
+    def load(self, ver: int) -> Optional[List[Dict]]:
+        """Rows of snapshot `ver` as full dicts, or None if it is gone."""
+        if ver <= 0:
+            return None
+        return self._load(ver)[1]
+
+    def load_latest(self) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        (version, rows) of the newest snapshot, read in one script call so the
+        version and its data always match; (0, None) before the first save.
+        """
+        return self._load(0)
+
+    def wait_latest(self, min_version: int = 1, timeout: Optional[float] = None,
+                    stop: Optional[threading.Event] = None, max_delay: float = 5.0,
+                    log=None) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Block until a snapshot with version >= `min_version` is readable and
+        return (version, rows). Sleeps on the save notification channel and
+        re-checks with exponential backoff (0.1 s doubling to `max_delay`) in
+        case a notification is missed or Redis is briefly unreachable.
+        Returns (0, None) once `timeout` seconds pass or `stop` is set.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.1
+        pubsub = None
+        try:
+            while True:
+                try:
+                    if pubsub is None:
+                        # subscribe before checking so a save in between still wakes us
+                        pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                        pubsub.subscribe(self.k_saved)
+                    ver, rows = self.load_latest()
+                    if ver >= min_version and rows is not None:
+                        return ver, rows
+                    if log:
+                        log(f"Waiting for snapshot v>={min_version} (latest v{ver}), retry in {delay:.1f}s")
+                except redis.RedisError as e:
+                    if log:
+                        log(f"Snapshot not readable yet: {e}")
+                    if pubsub is not None:
+                        pubsub.close()
+                        pubsub = None
+
+                wait = delay
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return 0, None
+                    wait = min(wait, remaining)
+                if stop is not None and stop.is_set():
+                    return 0, None
+                if pubsub is not None:
+                    try:
+                        pubsub.get_message(timeout=wait)   # returns early when a version is saved
+                    except redis.RedisError:
+                        pubsub.close()
+                        pubsub = None
+                        time.sleep(wait)
+                elif stop is not None:
+                    stop.wait(wait)
+                else:
+                    time.sleep(wait)
+                delay = min(delay * 2, max_delay)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+    def stats(self) -> Dict:
+        versions = self.r.zrange(self.k_versions, 0, -1)
+        size = 0
+        if versions:
+            pipe = self.r.pipeline()
+            for v in versions:
+                pipe.strlen(self.k_window.format(ver=int(v)))
+            size = sum(pipe.execute())
+        return {"latest": self.latest_version(), "versions": len(versions), "bytes": size}
@@ -0,0 +1,106 @@
+# stub_trending_api.py
+# Local stand-in for the trending pairs endpoint: serves the rows of the
+# trending page fixture (fixtures/trending_solana.html, parsed like the
+# browser path does) as dexscreener API pair objects.
+#   python stub_trending_api.py --port 8089
+#   TRENDING_API_URL=http://127.0.0.1:8089/trending python new-token-extractor-redis.py
+# --status 503 / --delay 15 make it fail or time out to exercise the browser fallback.
+# --check fetches the stub through HttpTrendingFetcher and diffs the rows
+# against parse_trending_rows on the same page.
+import os
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from extractors import parse_num, parse_trending_rows
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "trending_solana.html")
+
+def pairs_from_rows(rows: List[Dict]) -> List[Dict]:
+    pairs = []
+    for row in rows:
+        # `contract` is the (lowercased) pair address; the thumbnail has the token's
+        address = row["thumbnail"].rsplit("/", 1)[-1].split(".")[0]
+        pairs.append({
+            "chainId": "solana",
+            "pairAddress": row["contract"],
+            "baseToken": {"address": address, "name": row["name"], "symbol": row["symbol"]},
+            "marketCap": parse_num(row["market_cap_raw"]),
+            "liquidity": {"usd": parse_num(row["liquidity_raw"])},
+            "volume": {"h24": parse_num(row["volume_raw"])},
+        })
+    return pairs
+
+def pairs_from_html(html: str) -> List[Dict]:
+    return pairs_from_rows(parse_trending_rows(html, len(html)))
+
+def make_server(pairs: List[Dict], port: int = 0, status: int = 200, delay: float = 0.0) -> ThreadingHTTPServer:
+    """Server on 127.0.0.1:`port` (0 = any free port; see server.server_port)."""
+    body = json.dumps({"pairs": pairs}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, like the real endpoint
+
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            payload = body if status == 200 else b'{"error": "stub"}'
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+def serve_in_thread(pairs: List[Dict], **kwargs) -> ThreadingHTTPServer:
+    server = make_server(pairs, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def check(html: str) -> int:
+    """Rows of the JSON path vs the rendered page; returns the number of differing rows."""
+    from fetchers import HttpPool, HttpTrendingFetcher
+    expected = parse_trending_rows(html, len(html))
+    server = serve_in_thread(pairs_from_html(html))
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/trending"
+        rows = HttpTrendingFetcher(url, pool=HttpPool(url)).fetch(len(expected))
+    finally:
+        server.shutdown()
+    bad = 0
+    for rank, (want, got) in enumerate(zip(expected, rows), 1):
+        diff = {k: (want.get(k), got.get(k)) for k in want if want.get(k) != got.get(k)}
+        if diff:
+            bad += 1
+            print(f"row {rank}: {diff}")
+    if len(rows) != len(expected):
+        bad += abs(len(rows) - len(expected))
+        print(f"{len(rows)} rows from the JSON path, {len(expected)} on the page")
+    print(f"{len(expected) - bad}/{len(expected)} rows identical")
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in for the trending pairs endpoint")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--status", type=int, default=200)
+    ap.add_argument("--delay", type=float, default=0.0)
+    ap.add_argument("--fixture", default=FIXTURE, help="saved trending page HTML")
+    ap.add_argument("--check", action="store_true", help="compare the JSON path with the page and exit")
+    args = ap.parse_args()
+    with open(args.fixture) as f:
+        html = f.read()
+    if args.check:
+        raise SystemExit(1 if check(html) else 0)
+    pairs = pairs_from_html(html)
+    server = make_server(pairs, args.port, args.status, args.delay)
+    print(f"Serving {len(pairs)} pairs on http://127.0.0.1:{server.server_port}/trending")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
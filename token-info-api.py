@@ -1,177 +1,378 @@
 import os
 import json
+import time
+import datetime as dt
 import mysql.connector
-import re
-from flask import Flask, jsonify
-from seleniumbase import SB
-import urllib.parse
+import redis
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, jsonify, request, stream_with_context
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 
 load_dotenv()
 
+# imported after load_dotenv() so DB_URL/pool/parser settings from .env are visible
+from browser_pool import BrowserPool
+from db import DBPool, ensure_database
+from extractors import parse_token_info
+from job_queue import JobQueue, JobRunner, valid_callback_url
+from response_cache import SingleFlightCache
+from schema import ensure_tokens_table
+from token_history import DEFAULT_FEED, query_series
+from leaderboard import read_leaderboard
+from readiness import Readiness
+from session_store import ClearanceStore
+
 app = Flask(__name__)
 
-# Environment variables
-db_url = os.getenv("DB_URL")  # Set this in your .env file
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+r = redis.from_url(REDIS_URL, decode_responses=True)
 
-if not db_url:
-    raise RuntimeError("DB_URL environment variable is required")
+# pooled MySQL connections from DB_URL; each request thread checks out its own
+DB = DBPool(autocommit=True)
 
-url = urllib.parse.urlparse(db_url)
+HEADLESS = os.getenv("HEADLESS", "1") == "1"
+DEBUG = os.getenv("FLASK_DEBUG", "1") == "1"
 
-sqldb = mysql.connector.connect(
-    host=url.hostname,
-    port=url.port,
-    user=url.username,
-    password=url.password,
-    database=url.path.lstrip("/"),
-    ssl_disabled=False,
-    autocommit=True
-)
+# scraped token info is reused for TOKEN_CACHE_TTL seconds; concurrent requests
+# for the same address share one scrape
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE = SingleFlightCache(ttl=TOKEN_CACHE_TTL, max_entries=int(os.getenv("TOKEN_CACHE_SIZE", "5000")))
 
-HEADLESS = os.getenv("HEADLESS", "1") == "1"
+# rows in `tokens` are served without scraping while younger than this (seconds)
+TOKEN_DB_MAX_AGE = int(os.getenv("TOKEN_DB_MAX_AGE", "86400"))
+CHAIN = "sol"
+
+# warm browsers shared by request threads (BROWSER_POOL_SIZE caps concurrent scrapes)
+# Cloudflare clearance saved per domain and loaded into new/recycled browsers
+SESSIONS = ClearanceStore(r)
+# page-ready polling with timeouts learned from past load times (see readiness.py)
+READINESS = Readiness(r, sessions=SESSIONS)
+BROWSER_POOL = BrowserPool(headless=HEADLESS, sessions=SESSIONS, readiness=READINESS)
+
+# POST /tokens/batch: max addresses per call / concurrent scrapes per call
+BATCH_MAX_CONTRACTS = int(os.getenv("BATCH_MAX_CONTRACTS", "200"))
+BATCH_SCRAPE_CONCURRENCY = int(os.getenv("BATCH_SCRAPE_CONCURRENCY", str(BROWSER_POOL.size)))
+
+# async scrape jobs: POST /jobs/token queues, JOB_WORKERS threads work the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+TOKEN_JOBS = JobQueue(r, "token-info")
 
 def dprint(message):
     print(f"API:: {message}")
 
+def normalize_contract(token_address: str) -> str:
+    # the tokens table, the trending extractor and parse_token_info all key on
+    # the lowercased address; the memory cache must too
+    return token_address.strip().lower()
+
 def scrape_token_info(addr: str) -> dict:
-    with SB(uc=True, test=True, locale_code="en", headless=HEADLESS) as sb:
+    with BROWSER_POOL.lease() as browser:
+        sb = browser.sb
         dprint(f"Navigate: {addr}")
-        sb.activate_cdp_mode(addr)
-        sb.sleep(1)
-        try: sb.uc_gui_click_captcha()
-        except Exception as e: dprint(f"Captcha not present/ignored: {e}")
-        sb.sleep(1)
+        browser.open(addr)
+        try: READINESS.wait(sb, "token_info")
+        except TimeoutError as e: dprint(f"Parsing a page that never became ready: {e}")
         html = sb.get_page_source()
 
-    soup = BeautifulSoup(html, "html.parser")
-    
-    # Find the logo image URL using BeautifulSoup
-    logo_img = soup.find('img', src=re.compile(r'cdn\.dexscreener\.com/cms/images/'))
-    logo_url = logo_img['src'] if logo_img else None
-    
-    # Extract token name (prefer header structure)
-    # 1) Look inside <header> that has (itself or descendants) class 'chakra-stack'
-    #    and contains h2.chakra-heading.
-    header_candidates = []
-    for hdr in soup.find_all('header'):
-        has_stack = ('chakra-stack' in (hdr.get('class') or [])) or bool(hdr.find(class_='chakra-stack'))
-        if not has_stack:
-            continue
-        h2 = hdr.find('h2', class_='chakra-heading')
-        if not h2:
-            continue
-        span = h2.find('span')
-        text = (span.get_text(strip=True) if span else h2.get_text(strip=True))
-        if text and 1 <= len(text) <= 120:
-            header_candidates.append((hdr, h2, text))
-
-    if not header_candidates:
-        dprint("Name pattern debug (header): No <header> with chakra-stack and h2.chakra-heading found")
-    else:
-        dprint(f"Name pattern debug (header): Found {len(header_candidates)} candidates")
-        for idx, (_, _, txt) in enumerate(header_candidates):
-            dprint(f"  [H{idx}] {txt}")
-
-    # Extract token symbol (prefer element structure)
-    # 1) Look inside <div> that has (itself or descendants) class 'chakra-stack'
-    #    and contains h2.chakra-heading. 
-    #  h2 contains span with symbol text.
-    symbol_candidates = []
-    for div in soup.find_all('div'):
-        has_stack = ('chakra-stack' in (div.get('class') or [])) or bool(div.find(class_='chakra-stack'))
-        if not has_stack:
-            continue
-        h2 = div.find('h2', class_='chakra-heading')
-        if not h2:
-            continue
-        span = h2.find('span')
-        text = (span.get_text(strip=True) if span else h2.get_text(strip=True))
-        if text and 1 <= len(text) <= 20:
-            symbol_candidates.append((div, h2, text))
-
-    if not symbol_candidates:
-        dprint("Symbol pattern debug (div): No <div> with chakra-stack and h2.chakra-heading found")
-    else:
-        dprint(f"Symbol pattern debug (div): Found {len(symbol_candidates)} candidates")
-        for idx, (_, _, txt) in enumerate(symbol_candidates):
-            dprint(f"  [S{idx}] {txt}")
-
-    # find Pair Address 
-    # 01. there are two sibiling elements which aire button and anchor
-    # 02. anchor contains href (like - "https://solscan.io/account/7AHvKNXx95BCGita89J9LgvdENfS7feRk8L4Zztn4Cj1")
-
-    pair_address = None
-    siblings = soup.find_all('div')
-
-    for div in siblings:
-        button = div.find('button')
-        anchor = div.find('a', href=True)
-        if button and anchor:
-            href = anchor['href']
-            if 'solscan.io/account/' in href:
-                pair_address = href.split('/')[-1]
-                dprint(f"Found Pair Address: {pair_address}")
-                break
-    if not pair_address:
-        dprint("Pair Address pattern debug: No matching div with button and anchor found")
-
-    # Extract Audit status
-    audit_status = 0
-    # Look for div with text "Audit"
-    audit_label = soup.find('div', string='Audit')
-    if audit_label:
-        value_div = audit_label.find_next_sibling('div')
-        if value_div:
-            if "No issues" in value_div.get_text(strip=True):
-                audit_status = 1
-        dprint(f"Found Audit Status: {audit_status}")
-
-    token_data = {
-        # store the contract address in simple letter form
-        'contract': addr.split('/')[-1].lower(),
-        'name': header_candidates[0][2] if header_candidates else None,
-        'symbol': symbol_candidates[0][2] if symbol_candidates else None,
-        'logo_url': logo_url,
-        'pair_address': pair_address,
-        'audit': audit_status
-    }
-
+    token_data = parse_token_info(html, addr)
+    dprint(f"Parsed token info: {token_data}")
     return token_data
 
+TOKEN_INFO_FIELDS = ("contract", "name", "symbol", "logo_url", "pair_address", "audit")
+
+SELECT_TOKEN_SQL = """
+    SELECT contract, name, symbol, logo_url, pair_address, audit,
+           TIMESTAMPDIFF(SECOND, updated_at, CURRENT_TIMESTAMP) AS age
+    FROM tokens WHERE contract IN ({placeholders})
+"""
+
+# scraped fields only overwrite what the page actually had; market data from
+# the trending extractor is left alone
+UPSERT_TOKEN_INFO_SQL = """
+    INSERT INTO tokens (contract, chain, name, symbol, logo_url, pair_address, audit)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name=COALESCE(VALUES(name), name),
+        symbol=COALESCE(VALUES(symbol), symbol),
+        logo_url=COALESCE(VALUES(logo_url), logo_url),
+        pair_address=COALESCE(VALUES(pair_address), pair_address),
+        audit=VALUES(audit),
+        updated_at=CURRENT_TIMESTAMP
+"""
+
+# backdates the row past TOKEN_DB_MAX_AGE so the next load scrapes again
+# (the trending extractor's upsert leaves updated_at alone)
+STALE_TOKEN_SQL = """
+    UPDATE tokens SET updated_at = CURRENT_TIMESTAMP - INTERVAL %s SECOND
+    WHERE contract = %s
+"""
+
+def _servable(row) -> bool:
+    # audit stays NULL until a token-info scrape has written the row; rows
+    # inserted by the trending extractor alone lack logo/pair/audit
+    if row["audit"] is None or not row["name"] or not row["symbol"]:
+        return False
+    return row["age"] is not None and row["age"] <= TOKEN_DB_MAX_AGE
+
+def load_token_rows(contracts) -> dict:
+    """contract -> stored token info, for the rows complete and fresh enough to serve."""
+    contracts = list(contracts)
+    if not contracts:
+        return {}
+    sql = SELECT_TOKEN_SQL.format(placeholders=", ".join(["%s"] * len(contracts)))
+    try:
+        with DB.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, contracts)
+            rows = cursor.fetchall()
+            cursor.close()
+    except (mysql.connector.Error, TimeoutError) as err:
+        dprint(f"DB lookup failed for {len(contracts)} tokens, scraping instead: {err}")
+        return {}
+    return {row["contract"]: {k: row[k] for k in TOKEN_INFO_FIELDS}
+            for row in rows if _servable(row)}
+
+def load_token_row(contract: str):
+    """The stored token info if it is complete and fresh enough to serve, else None."""
+    return load_token_rows([contract]).get(contract)
+
+def save_token_row(token_data: dict):
+    values = (token_data["contract"], CHAIN, token_data.get("name"), token_data.get("symbol"),
+              token_data.get("logo_url"), token_data.get("pair_address"), token_data.get("audit"))
+    try:
+        DB.run(lambda cur: cur.execute(UPSERT_TOKEN_INFO_SQL, values))
+    except (mysql.connector.Error, TimeoutError) as err:
+        dprint(f"Failed to store token info for {token_data['contract']}: {err}")
+
+def mark_token_stale(contract: str) -> bool:
+    """Make the stored row too old to serve; False if there is none or the DB is down."""
+    def backdate(cur):
+        cur.execute(STALE_TOKEN_SQL, (TOKEN_DB_MAX_AGE + 1, contract))
+        return cur.rowcount
+    try:
+        return DB.run(backdate) > 0
+    except (mysql.connector.Error, TimeoutError) as err:
+        dprint(f"Failed to mark {contract} stale: {err}")
+        return False
+
+def load_token_info(token_address: str, refresh: bool = False):
+    """(token_data, source): the `tokens` table first, dexscreener as the fallback."""
+    if not refresh:
+        row = load_token_row(token_address)
+        if row:
+            return row, "db"
+    return scrape_and_store(token_address)
+
+def scrape_and_store(token_address: str):
+    """(token_data, "scrape") with the result written back to `tokens`, or None."""
+    token_data = scrape_token_info(f"https://dexscreener.com/solana/{token_address}")
+    if not token_data or not (token_data.get("name") or token_data.get("pair_address")):
+        # nothing usable on the page (challenge, unknown token): don't cache or store it
+        return None
+    save_token_row(token_data)
+    return token_data, "scrape"
+
+def fetch_token_info(token_address: str, refresh: bool = False):
+    """((token_data, source), cache_status); memory cache -> tokens table -> scrape."""
+    return TOKEN_CACHE.get_or_load(
+        token_address, lambda: load_token_info(token_address, refresh), refresh=refresh)
+
+def run_token_job(payload: dict) -> dict:
+    result, _ = fetch_token_info(normalize_contract(payload["contract"]), bool(payload.get("refresh")))
+    if not result:
+        raise RuntimeError("Failed to scrape token data")
+    token_data, source = result
+    return {"token": token_data, "source": source}
+
+def stream_token_batch(contracts, refresh: bool):
+    """
+    NDJSON lines, one per contract: everything the memory cache or the tokens
+    table can answer goes out first, the rest as their scrapes finish.
+    """
+    def line(contract, result=None, cache_status=None, error=None):
+        if result:
+            token_data, source = result
+            out = {"contract": contract, "source": source, "cache": cache_status, "data": token_data}
+        else:
+            out = {"contract": contract, "error": error or "Failed to scrape token data"}
+        return json.dumps(out) + "\n"
+
+    pending = list(contracts)
+    if not refresh:
+        missing = []
+        for contract in pending:
+            result = TOKEN_CACHE.get(contract)
+            if result:
+                yield line(contract, result, "HIT")
+            else:
+                missing.append(contract)
+        stored = load_token_rows(missing)
+        pending = []
+        for contract in missing:
+            row = stored.get(contract)
+            if row:
+                TOKEN_CACHE.put(contract, (row, "db"))
+                yield line(contract, (row, "db"), "MISS")
+            else:
+                pending.append(contract)
+    if not pending:
+        return
+
+    def scrape(contract):
+        return TOKEN_CACHE.get_or_load(contract, lambda: scrape_and_store(contract), refresh=refresh)
+
+    # each scrape leases its own pooled browser, so more threads than browsers only queue
+    pool = ThreadPoolExecutor(max_workers=min(BATCH_SCRAPE_CONCURRENCY, len(pending)),
+                              thread_name_prefix="batch-scrape")
+    try:
+        futures = {pool.submit(scrape, c): c for c in pending}
+        for fut in as_completed(futures):
+            contract = futures[fut]
+            try:
+                result, cache_status = fut.result()
+                yield line(contract, result, cache_status)
+            except Exception as e:
+                dprint(f"Batch scrape failed for {contract}: {e}")
+                yield line(contract, error=str(e))
+    finally:
+        # client went away: drop the scrapes that haven't started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+TOKEN_JOB_RUNNER = JobRunner(TOKEN_JOBS, run_token_job, workers=JOB_WORKERS,
+                             name="token-job", log=dprint)
+
 @app.route('/token/<token_address>', methods=['GET'])
 def get_token_info(token_address: str):
-    # Scrape from dexscreener
-    addr = f"https://dexscreener.com/solana/{token_address}"
-    token_data = scrape_token_info(addr)
-    
-    if token_data:            
-        return jsonify(token_data)
+    # memory cache -> tokens table -> dexscreener scrape (?refresh=1 skips to the scrape)
+    refresh = request.args.get("refresh") == "1"
+    token_address = normalize_contract(token_address)
+    result, cache_status = fetch_token_info(token_address, refresh)
+
+    if result:
+        token_data, source = result
+        resp = jsonify(token_data)
+        resp.headers["X-Cache"] = cache_status
+        resp.headers["X-Source"] = source
+        resp.headers["Cache-Control"] = f"public, max-age={TOKEN_CACHE_TTL}"
+        return resp
     else:
         return jsonify({"error": "Failed to scrape token data"}), 500
 
+@app.route('/token/<token_address>', methods=['DELETE'])
+def invalidate_token_info(token_address: str):
+    # both tiers, so the next GET scrapes instead of serving the stored row
+    token_address = normalize_contract(token_address)
+    removed = TOKEN_CACHE.invalidate(token_address)
+    stale = mark_token_stale(token_address)
+    return jsonify({"contract": token_address, "invalidated": removed, "db_row_stale": stale})
+
+def _parse_time(value, default: int) -> int:
+    """Unix seconds or ISO 8601 (naive = UTC) query parameter."""
+    if not value:
+        return default
+    if value.isdigit():
+        return int(value)
+    t = dt.datetime.fromisoformat(value)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=dt.timezone.utc)
+    return int(t.timestamp())
+
+@app.route('/token/<token_address>/history', methods=['GET'])
+def get_token_history(token_address: str):
+    # ?from=&to= (unix or ISO 8601, default the last 24h) &interval=raw|minute|hour|day
+    # &feed=<chain>-<rankBy> (default the solana trending feed)
+    token_address = normalize_contract(token_address)
+    interval = request.args.get("interval", "minute")
+    feed = request.args.get("feed", DEFAULT_FEED)
+    try:
+        end = _parse_time(request.args.get("to"), int(time.time()))
+        start = _parse_time(request.args.get("from"), end - 86400)
+        points = query_series(DB, token_address, start, end, interval, feed)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except (mysql.connector.Error, TimeoutError) as err:
+        dprint(f"History query failed for {token_address}: {err}")
+        return jsonify({"error": "History unavailable"}), 503
+    return jsonify({"contract": token_address, "feed": feed, "interval": interval,
+                    "from": start, "to": end, "points": points})
+
+@app.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    # ?order=gross_profit|win_rate&limit=50&offset=0 (maintained by the trader extractor)
+    try:
+        limit = min(int(request.args.get("limit", 50)), 500)
+        offset = max(int(request.args.get("offset", 0)), 0)
+        wallets = read_leaderboard(DB, request.args.get("order", "gross_profit"), limit, offset)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except (mysql.connector.Error, TimeoutError) as err:
+        dprint(f"Leaderboard query failed: {err}")
+        return jsonify({"error": "Leaderboard unavailable"}), 503
+    return jsonify({"wallets": wallets})
+
+@app.route('/tokens/batch', methods=['POST'])
+def get_token_info_batch():
+    # {"contracts": ["...", ...], "refresh": false} -> application/x-ndjson
+    body = request.get_json(silent=True) or {}
+    contracts = body.get("contracts")
+    if not isinstance(contracts, list) or not all(isinstance(c, str) and c for c in contracts):
+        return jsonify({"error": "contracts must be a list of addresses"}), 400
+    contracts = list(dict.fromkeys(normalize_contract(c) for c in contracts))
+    if len(contracts) > BATCH_MAX_CONTRACTS:
+        return jsonify({"error": f"at most {BATCH_MAX_CONTRACTS} contracts per batch"}), 400
+
+    return Response(stream_with_context(stream_token_batch(contracts, bool(body.get("refresh")))),
+                    mimetype="application/x-ndjson")
+
+@app.route('/jobs/token', methods=['POST'])
+def create_token_job():
+    # {"contract": "...", "callback_url": "https://..." (optional), "refresh": false}
+    body = request.get_json(silent=True) or {}
+    contract = body.get("contract")
+    callback_url = body.get("callback_url")
+    if not contract or not isinstance(contract, str):
+        return jsonify({"error": "contract is required"}), 400
+    if callback_url and not valid_callback_url(callback_url):
+        return jsonify({"error": "callback_url must be an http(s) URL on an allowed public host"}), 400
+
+    job_id = TOKEN_JOBS.enqueue({"contract": normalize_contract(contract), "refresh": bool(body.get("refresh"))},
+                                callback_url=callback_url)
+    resp = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"})
+    resp.status_code = 202
+    resp.headers["Location"] = f"/jobs/{job_id}"
+    return resp
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    job = TOKEN_JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        "browser_pool": BROWSER_POOL.stats(),
+        "db_pool": DB.stats(),
+        "token_cache": TOKEN_CACHE.stats(),
+        "token_jobs": TOKEN_JOB_RUNNER.stats(),
+        "page_loads": READINESS.stats(),
+        "sessions": SESSIONS.stats(),
+    })
+
 if __name__ == "__main__":
-    # Use tokens table in solana_tokens DB
-    # try:
-    #     sql_cursor = sqldb.cursor(buffered=True)
-    #     sql_cursor.execute("USE solana_tokens")
-    #     sql_cursor.execute("""
-    #         CREATE TABLE IF NOT EXISTS tokens (
-    #             contract VARCHAR(64) PRIMARY KEY,
-    #             chain VARCHAR(10),
-    #             name VARCHAR(255),
-    #             symbol VARCHAR(50),
-    #             market_cap DOUBLE,
-    #             liquidity DOUBLE,
-    #             volume DOUBLE,
-    #             thumbnail VARCHAR(255)
-    #         )
-    #                 """)
-    #     sqldb.commit()
-    #     sql_cursor.close()
-    # except mysql.connector.Error as err:
-    #     print(f"Error initializing MySQL: {err}")
-    #     exit(1)
-
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # tokens table is shared with the trending extractor; make sure the
+    # token-info columns exist before serving from it
+    try:
+        ensure_database()
+        DB.run(ensure_tokens_table)
+    except mysql.connector.Error as err:
+        print(f"Error initializing MySQL: {err}")
+        exit(1)
+
+    # with debug=True the reloader re-runs this file in a child process;
+    # only the child (which serves requests) works the job queue
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        TOKEN_JOB_RUNNER.start()
+
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,87 @@
+# token_history.py
+# Append-only per-token rank/metric history in the `token_metrics` table
+# (see schema.py) and the downsampled series queries on top of it.
+import os
+import math
+from typing import Dict, List
+
+HISTORY_BUCKET_SECONDS = int(os.getenv("HISTORY_BUCKET_SECONDS", "5"))   # raw sample resolution
+HISTORY_RETAIN_DAYS = int(os.getenv("HISTORY_RETAIN_DAYS", "30"))        # 0 = keep forever
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "20000"))
+
+INTERVALS = {"raw": HISTORY_BUCKET_SECONDS, "minute": 60, "hour": 3600, "day": 86400}
+
+# feeds.Feed.name of the original solana trending feed (the column default)
+DEFAULT_FEED = "solana-trendingScoreH24"
+
+# a second sample of the same feed in the same bucket replaces the first;
+# feeds tracking the same contract keep separate series
+INSERT_METRICS_SQL = """
+    INSERT INTO token_metrics (contract, feed, ts, chain, trend_rank, market_cap, liquidity, volume)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        trend_rank=VALUES(trend_rank),
+        market_cap=VALUES(market_cap),
+        liquidity=VALUES(liquidity),
+        volume=VALUES(volume)
+"""
+
+# the PK (contract, feed, ts) range scan plus partition pruning on ts keeps this to
+# the rows of one token in the requested range
+SERIES_SQL = """
+    SELECT ts DIV %(step)s * %(step)s AS bucket,
+           COUNT(*) AS samples,
+           MIN(trend_rank) AS rank_best,
+           AVG(trend_rank) AS rank_avg,
+           AVG(market_cap) AS market_cap,
+           AVG(liquidity) AS liquidity,
+           AVG(volume) AS volume
+    FROM token_metrics
+    WHERE contract = %(contract)s AND feed = %(feed)s AND ts >= %(start)s AND ts < %(end)s
+    GROUP BY bucket
+    ORDER BY bucket
+"""
+
+def _num(v: float):
+    return None if v is None or math.isnan(v) else v
+
+def history_rows(tokens: List[Dict], as_of_ts: float, feed: str = DEFAULT_FEED) -> List[tuple]:
+    """INSERT_METRICS_SQL rows for one scraped window of `feed`."""
+    ts = int(as_of_ts) // HISTORY_BUCKET_SECONDS * HISTORY_BUCKET_SECONDS
+    return [(t["contract"], feed, ts, t["chain"], t["rank"], _num(t["market_cap"]),
+             _num(t["liquidity"]), _num(t["volume"])) for t in tokens]
+
+def query_series(db, contract: str, start: int, end: int, interval: str = "minute",
+                 feed: str = DEFAULT_FEED) -> List[Dict]:
+    """
+    Buckets of `interval` ("raw", "minute", "hour", "day") between unix
+    times [start, end) of one feed's series: sample count, best/average rank
+    and average metrics.
+    Raises ValueError for an unknown interval or a range with too many points.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+    step = INTERVALS[interval]
+    if end <= start:
+        raise ValueError("end must be after start")
+    if (end - start) // step > HISTORY_MAX_POINTS:
+        raise ValueError(f"range too large for interval '{interval}' (max {HISTORY_MAX_POINTS} points)")
+
+    params = {"step": step, "contract": contract.lower(), "feed": feed, "start": start, "end": end}
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(SERIES_SQL, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    out = []
+    for row in rows:
+        out.append({
+            "t": int(row["bucket"]),
+            "samples": int(row["samples"]),
+            "rank_best": row["rank_best"],
+            "rank_avg": None if row["rank_avg"] is None else round(float(row["rank_avg"]), 2),
+            "market_cap": row["market_cap"],
+            "liquidity": row["liquidity"],
+            "volume": row["volume"],
+        })
+    return out
@@ -1,32 +1,42 @@
 #  redis-server --daemonize yes
 import os
-import json
+import atexit
+import queue
+import signal
 import threading
 import mysql.connector
 import redis
-import re
 from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
-from seleniumbase import SB
-import urllib.parse
+from browser_pool import BrowserPool
+from db import DBPool, TRANSIENT_ERRORS, ensure_database
+from worker_pool import WorkerPool
+from wallet_cache import WalletCache
+from extractors import parse_trader_wallets, parse_wallet_stats
+from write_behind import WriteBehindBuffer
+from schema import ensure_leaderboard_table, ensure_wallet_tables, table_exists
+from wallet_store import migrate_traders, observation_row, write_observations
+from leaderboard import update_leaderboard
+from snapshot_store import SnapshotStore
+from event_bus import StreamConsumer
+from readiness import Readiness
+from session_store import ClearanceStore
 
 DB_WRITE = True  # Set to False to disable DB writes (for testing)
 
-db_url = os.getenv("DB_URL")  # Set this in your .env file
+# Worker pool tunables
+WORKERS = int(os.getenv("TRADER_WORKERS", "1"))
+QUEUE_SIZE = int(os.getenv("TRADER_QUEUE_SIZE", "200"))
 
-if not db_url:
-    raise RuntimeError("DB_URL environment variable is required")
+# Write-behind tunables for trader rows
+FLUSH_BATCH = int(os.getenv("TRADER_FLUSH_BATCH", "50"))
+FLUSH_INTERVAL = float(os.getenv("TRADER_FLUSH_INTERVAL", "2"))
+MAX_PENDING_ROWS = int(os.getenv("TRADER_MAX_PENDING_ROWS", "1000"))
 
-url = urllib.parse.urlparse(db_url)
+# dexcheck wallet pages loaded in parallel tabs per token (1 = one after another)
+WALLET_FANOUT = int(os.getenv("TRADER_WALLET_FANOUT", "4"))
 
-sqldb = mysql.connector.connect(
-    host=url.hostname,
-    port=url.port,
-    user=url.username,
-    password=url.password,
-    database=url.path.lstrip("/"),
-    ssl_disabled=False
-)
+# pooled MySQL connections from DB_URL (see db.py); every thread checks out its own
+DB = DBPool()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 # DB_CFG = {
@@ -36,16 +46,25 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 #     "password": os.getenv("MYSQL_PASS", "1234"),
 #     "database": os.getenv("MYSQL_DB", "solana_tokens"),
 # }
-EVENT_CHANNEL = "token_changed"
-DEDUPE_SET = "processed_event_ids"  # Redis set for idempotency
-DEDUPE_TTL = 600  # seconds
-
-K_CUR = "trending:window:current"            # JSON array (latest-only snapshot)
-K_LATEST_VER = "trending:latest_version"     # string int
-K_WINDOW_VER = "trending:window:{ver}"       # JSON array by version
+EVENT_GROUP = os.getenv("EVENT_GROUP", "trader-extractor")  # consumer group on the token_changed stream
 
 r = redis.from_url(REDIS_URL, decode_responses=True)
 
+# trending window snapshots written by the trending extractor (binary values)
+SNAPSHOTS = SnapshotStore(redis.from_url(REDIS_URL))
+
+# parsed wallet stats shared across tokens/workers (WALLET_CACHE_TTL=0 disables)
+WALLET_CACHE = WalletCache(r)
+
+# warm browsers leased per token instead of a cold Chrome per token (one per worker)
+# Cloudflare clearance saved per domain (dexscreener, dexcheck) and loaded
+# into new/recycled browsers instead of solving the challenge again
+SESSIONS = ClearanceStore(r)
+# page-ready polling with timeouts learned from past load times; the ready
+# selectors of each page type live in readiness.SELECTORS (SCRAPER_SELECTORS)
+READINESS = Readiness(r, sessions=SESSIONS)
+BROWSER_POOL = BrowserPool(size=WORKERS, headless=True, sessions=SESSIONS, readiness=READINESS)
+
 # sqldb = mysql.connector.connect(
 #     host=DB_CFG["host"],
 #     port=DB_CFG["port"],
@@ -55,8 +74,6 @@ r = redis.from_url(REDIS_URL, decode_responses=True)
 #     ssl_disabled=False
 # )
 
-sql_cursor = sqldb.cursor()
-
 DEBUG_PRINT = True  # Set to True for debugging output
 def dprint(message):
     if DEBUG_PRINT:
@@ -64,25 +81,16 @@ def dprint(message):
         thread_info = f"tid-{thread.ident}"
         print(f"{thread_info}:: {message}")
 
-def load_current_snapshot() -> List[Dict]:
-    """Load the latest snapshot (supports both single 'current' and versioned)."""
-    while(1):
-        v = r.get(K_LATEST_VER)
-        if v:
-            raw = r.get(K_WINDOW_VER.format(ver=int(v)))
-            if raw:
-                try:
-                    # display the info of the snapshot -> version, no. of tokens
-                    snapshot = json.loads(raw)
-                    dprint(f"Loaded snapshot for version {v} and no. of the tokens: {len(snapshot)}")
-                    return snapshot
-                
-                except Exception:
-                    dprint(f"Error loading snapshot for version {v}: {raw}")
-                    continue
-        else:
-            dprint(f"No version found")
-            continue
+def load_current_snapshot(stop: Optional[threading.Event] = None,
+                          timeout: Optional[float] = None) -> List[Dict]:
+    """Load the latest trending window snapshot, waiting (with backoff) until one exists."""
+    v, snapshot = SNAPSHOTS.wait_latest(timeout=timeout, stop=stop, log=dprint)
+    if not v:
+        dprint("No snapshot available")
+        return []
+    # display the info of the snapshot -> version, no. of tokens
+    dprint(f"Loaded snapshot for version {v} and no. of the tokens: {len(snapshot)}")
+    return snapshot
 
 def parse_number(value_str):
     if not value_str:
@@ -106,189 +114,136 @@ def parse_number(value_str):
     except ValueError:
         return None
 
-def _process_one_token(token_address: str):
-    url = f"https://dexscreener.com/solana/{token_address}"
-    try:
-        # Use SB context manager for automatic driver management and UC mode
-        # uc=True enables undetected-chromedriver features
-        # test=True can sometimes help with stability/configuration
-        # locale_code sets browser language, potentially aiding bypass
-        with SB(uc=True, test=True, locale_code="en", headless=True) as sb: # headless=True runs without visible browser
+def _wallet_url(wallet_address: str) -> str:
+    return f"https://dexcheck.ai/app/wallet-analyzer/{wallet_address}"
 
-            # activate_cdp_mode often used with uc=True for better interaction & navigation
-            sb.activate_cdp_mode(url)
+def _scrape_wallet(browser, wallet_address: str) -> Dict:
+    sb = browser.sb
 
-            # Short wait for the potential verification page to appear
-            sb.sleep(5)
+    # get the trader's gross profit, win rate, wins, losses, etc.
+    target_url = _wallet_url(wallet_address)
 
-            # Attempt to click the Cloudflare checkbox IF it appears visually
-            # SeleniumBase tries to handle this automatically, but this adds robustness
-            try:
-                sb.uc_gui_click_captcha()
-            except Exception as captcha_click_error:
-                dprint(f"Captcha click failed or wasn't necessary: {captcha_click_error}")
-            
-            # wait until the class custom-1oq7u8k loads
-            try:
-                sb.wait_for_element_visible('div.custom-1oq7u8k', timeout=100)
-            except Exception as e:
-                dprint(f"Error waiting for class custom-1oq7u8k elements: {e}")
-                # exit if the elements are not found
-                return token_address
+    browser.open(target_url)
 
-            # find the button with class 'custom-165cjlo' and click it
+    # polls for the stats block; the Cloudflare click is tried once if it is slow
+    READINESS.wait(sb, "wallet")
+
+    return parse_wallet_stats(sb.get_page_source(), parse_number)
+
+def _flush_traders(rows: List[tuple]):
+    """Runs on the write-behind thread: wallet upserts + change-only observations per batch."""
+    def write(cur):
+        write_observations(cur, rows)
+        # only the wallets in this batch are re-checked against the thresholds
+        update_leaderboard(cur, rows)
+    DB.run(write)
+    dprint(f"Flushed {len(rows)} wallet observations")
+
+TRADER_SINK = WriteBehindBuffer(
+    _flush_traders,
+    name="trader-sink",
+    batch_size=FLUSH_BATCH,
+    flush_interval=FLUSH_INTERVAL,
+    max_pending=MAX_PENDING_ROWS,
+    log=dprint,
+    transient_errors=TRANSIENT_ERRORS,
+)
+# rows still buffered when the process exits are flushed, not lost
+atexit.register(TRADER_SINK.close)
+
+def _save_trader(wallet_address: str, token_address: str, stats: Dict):
+    # queued for the write-behind thread; blocks only if MAX_PENDING_ROWS are waiting
+    TRADER_SINK.put(observation_row(wallet_address, token_address, stats))
+
+def _collect_wallet_stats(browser, token_address: str, wallets: List[str]):
+    """
+    Stats for each wallet: fresh cache entries as-is, the rest scraped from
+    dexcheck in up to WALLET_FANOUT tabs at once (stale entries as fallback).
+    """
+    cached = {w: WALLET_CACHE.lookup(w) for w in wallets}
+    todo = {_wallet_url(w): w for w, (_, state) in cached.items() if state != "fresh"}
+
+    if WALLET_FANOUT > 1 and len(todo) > 1:
+        wallet_timeout = READINESS.timeout("wallet")
+        results = browser.fan_out(
+            list(todo), READINESS.selector("wallet"),
+            lambda url, html: parse_wallet_stats(html, parse_number),
+            width=WALLET_FANOUT, timeout=wallet_timeout,
+            on_loaded=lambda url, seconds: READINESS.record("wallet", seconds))
+        for result in results.values():
+            if isinstance(result, TimeoutError):
+                READINESS.record_timeout("wallet")
+    else:
+        results = {}
+        for url, wallet_address in todo.items():
             try:
-                sb.click('button:contains("Top Traders")')
-                
-                # wait until class_='custom-1hhf88o' loads
-                try:
-                    sb.wait_for_element_visible('a.custom-1hhf88o', timeout=100)
-                except Exception as e:
-                    dprint(f"Error waiting for trader address elements: {e}")
-                    # Consider adding sb.save_screenshot_to_logs() here too on error
-                    return token_address
-
-                # extract the html of the page after clicking the button
-                page_source = sb.get_page_source()
-                soup = BeautifulSoup(page_source, 'html.parser')
-                
-                # find all the a tag with class 'ds-dex-table-row-trader-address'
-                trader_address_tags = soup.find_all('a', class_='custom-1hhf88o')
-                
-                # loop through the tags and extract the href attribute
-                if len(trader_address_tags) >= 10:
-                    for tag in trader_address_tags[:10]:  # Limit to first 10 traders
-                        if tag and 'href' in tag.attrs:
-                            href = tag['href']
-                            # debug_print(f"Found href: {href}")
-                            # https://solscan.io/account/8Hw9X9UwBso7Sp2CFnEEeUGW8pGDj9wghc78ccWFZWpU get the last part of the href
-                            wallet_address = href.split('/')[-1]
-
-                            # # check wallet address already exists in the database, if yes -> skip
-                            # sql_cursor.execute("SELECT COUNT(*) FROM traders WHERE wallet_address = %s", (wallet_address,))
-                            # exists = sql_cursor.fetchone()[0] > 0
-
-                            # if exists:
-                            #     dprint(f"Wallet address {wallet_address} already exists in the database, skipping.")
-                            #     continue
-
-                            # get the trader's gross profit, win rate, wins, losses, etc.
-                            target_url = f"https://dexcheck.ai/app/wallet-analyzer/{wallet_address}"
-
-                            sb.open(target_url)
-
-                            # Short wait for the potential verification page to appear
-                            sb.sleep(2)
-
-                            # Attempt to click the Cloudflare checkbox IF it appears visually
-                            # SeleniumBase tries to handle this automatically, but this adds robustness
-                            try:
-                                sb.uc_gui_click_captcha()
-                            except Exception as captcha_click_error:
-                                dprint(f"Captcha click failed or wasn't necessary: {captcha_click_error}")
-
-                            # wait until the element <h3 class="text-sm text-white/70"> is visible
-                            sb.wait_for_element_visible('img.bg-brand-background-highlight', timeout=50)
-
-                            page_source = sb.get_page_source()
-
-                            soup = BeautifulSoup(page_source, 'html.parser')
-
-                            # --- Check if the wallet is bot? if bot the name is like this "Bot (gasTzr94Pmp4Gf8vknQnqxeYxdgwFjbgdJa4msYRpnB)"
-                            # begin with Bot 
-                            bot_tag = soup.find('span', string=re.compile(r"^Bot\s*\(", flags=re.I))
-
-                            # --- Gross Profit ---
-                            gross_profit = soup.find('h3', string=re.compile(r"Gross Profit", flags=re.I))
-                            if gross_profit:
-                                gross_profit_value = parse_number(gross_profit.find_next('p').text.strip())
-
-                            # -- Realized Profit ---
-                            realized_profit = soup.find('p', string=re.compile(r"Realized", flags=re.I))
-                            if realized_profit:
-                                realized_profit_str = realized_profit.find_next('p').text.strip()
-                                realized_profit_value = realized_profit_str.split(" ")[0].replace(",", "").replace("$", "")
-                                realized_profit_percent = realized_profit_str.split(" ")[1].replace("(", "").replace(")", "").replace("%", "")
-
-                            # --- Unrealized Profit ---
-                            unrealized_profit = soup.find('p', string=re.compile(r"Unrealized", flags=re.I))
-                            if unrealized_profit:
-                                unrealized_profit_str = unrealized_profit.find_next('p').text.strip()
-                                unrealized_profit_value = unrealized_profit_str.split(" ")[0].replace(",", "").replace("$", "")
-                                unrealized_profit_percent = unrealized_profit_str.split(" ")[1].replace("(", "").replace(")", "").replace("%", "")
-
-                            # --- Win Rate ---
-                            win_rate = soup.find('h3', string=re.compile(r"Win Rate", flags=re.I))
-                            if win_rate:
-                                win_rate_value = parse_number(win_rate.find_next('p').text.strip())
-
-                            # --- Wins and Losses ---
-                            win_count = soup.find('p', string=re.compile(r"Win", flags=re.I))
-                            if win_count:
-                                win_value = parse_number(win_count.find_next('p').text.strip())
-                            loss_count = soup.find('p', string=re.compile(r"Lose", flags=re.I))
-                            if loss_count:
-                                loss_value = parse_number(loss_count.find_next('p').text.strip())
-
-                            # --- Trade Volume, Trades, Avg Trade Size ---
-                            # Based on known layout order and heading structure
-                            trade_volume = soup.find('p', string=re.compile(r"Trading Volume", flags=re.I))
-                            if trade_volume:
-                                trade_volume_value = parse_number(trade_volume.find_next('p').text.strip())
-
-                            trades = soup.find('p', string=re.compile(r"Trades", flags=re.I))
-                            if trades:
-                                trades_value = parse_number(trades.find_next('p').text.strip())
-
-                            avg_trade_size = soup.find('p', string=re.compile(r"Avg. Trade Size", flags=re.I))
-                            if avg_trade_size:
-                                avg_trade_size_value = parse_number(avg_trade_size.find_next('p').text.strip())
-
-
-                            if DB_WRITE:
-                                try:
-                                    sql_cursor.execute("""
-                                        INSERT INTO traders (wallet_address, token_address, gross_profit, realized_profit, 
-                                        realized_profit_percent, unrealized_profit, unrealized_profit_percent, win_rate, wins, losses, 
-                                        trade_volume, trades, avg_trade_size, is_bot)
-                                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                        ON DUPLICATE KEY UPDATE
-                                            token_address=VALUES(token_address),
-                                            gross_profit=VALUES(gross_profit),
-                                            realized_profit=VALUES(realized_profit),
-                                            realized_profit_percent=VALUES(realized_profit_percent),
-                                            unrealized_profit=VALUES(unrealized_profit),
-                                            unrealized_profit_percent=VALUES(unrealized_profit_percent),
-                                            win_rate=VALUES(win_rate),
-                                            wins=VALUES(wins),
-                                            losses=VALUES(losses),
-                                            trade_volume=VALUES(trade_volume),
-                                            trades=VALUES(trades),
-                                            avg_trade_size=VALUES(avg_trade_size),
-                                            is_bot=VALUES(is_bot)
-                                        """, (wallet_address, token_address, gross_profit_value, realized_profit_value,
-                                              realized_profit_percent, unrealized_profit_value, unrealized_profit_percent, win_rate_value,
-                                              win_value, loss_value, trade_volume_value, trades_value, avg_trade_size_value,
-                                              bot_tag is not None))
-                                    sqldb.commit()
-                                    dprint(f"Successfully inserted/updated wallet: {wallet_address}")
-                                except Exception as e:
-                                    dprint(f"Error inserting/updating wallet {wallet_address}: {e}")
-
-                                
-
-                    # dprint(f"Extracted wallet data from {token_address}")
-                    return token_address
-                else:
-                    dprint(f"Not enough traders found for token {token_address}")
-                    return token_address
-                             
+                results[url] = _scrape_wallet(browser, wallet_address)
             except Exception as e:
-                dprint(f"Error clicking 'Top Traders' button: {e}")
+                results[url] = e
+
+    for url, wallet_address in todo.items():
+        result = results.get(url)
+        stats, state = cached[wallet_address]
+        if isinstance(result, dict):
+            WALLET_CACHE.put(wallet_address, result)
+            cached[wallet_address] = (result, "fresh")
+        elif state == "stale":
+            # serve the stale entry rather than dropping the wallet
+            dprint(f"Wallet scrape failed for {wallet_address}, using stale cache: {result}")
+        else:
+            dprint(f"Wallet scrape failed for {wallet_address} on {token_address}: {result}")
+            cached[wallet_address] = (None, "miss")
 
-    except Exception as e:
-        dprint(f"An error occurred during SeleniumBase scraping: {e}")
-        # Consider adding sb.save_screenshot_to_logs() here too on error
+    for wallet_address in wallets:
+        stats, _ = cached[wallet_address]
+        if stats is not None and DB_WRITE:
+            _save_trader(wallet_address, token_address, stats)
+
+def _process_one_token(token_address: str):
+    """
+    Scrape one token's top traders and their wallet stats. Raises when the
+    pages could not be scraped, so the caller leaves the event unacked.
+    """
+    url = f"https://dexscreener.com/solana/{token_address}"
+    # Lease a warm uc/CDP browser from the pool; it is returned (or
+    # recycled) when the block exits
+    with BROWSER_POOL.lease() as browser:
+        sb = browser.sb
+
+        # first open activates CDP mode, later ones reuse the session
+        browser.open(url)
+
+        # wait until the pair page loads (Cloudflare click tried once if it is slow)
+        try:
+            READINESS.wait(sb, "pair")
+        except Exception as e:
+            raise RuntimeError(f"pair page for {token_address} not ready: {e}") from e
+
+        # open the Top Traders tab
+        try:
+            sb.click(READINESS.selector("top_traders_button"))
+        except Exception as e:
+            raise RuntimeError(f"could not open Top Traders for {token_address}: {e}") from e
+
+        # wait until the trader wallet links load
+        try:
+            READINESS.wait(sb, "top_traders", captcha=False)
+        except Exception as e:
+            # Consider adding sb.save_screenshot_to_logs() here too on error
+            raise RuntimeError(f"trader addresses for {token_address} not loaded: {e}") from e
+
+        # extract the trader wallets from the html after clicking the button
+        wallets = parse_trader_wallets(sb.get_page_source())
+
+        if len(wallets) >= 10:
+            # Limit to first 10 traders; fresh cached stats skip the dexcheck visit
+            _collect_wallet_stats(browser, token_address, wallets[:10])
+
+            dprint(f"Wallet cache: {WALLET_CACHE.stats()} | Trader sink: {TRADER_SINK.stats()}"
+                   f" | Page loads: {READINESS.stats()} | Sessions: {SESSIONS.stats()}")
+        else:
+            dprint(f"Not enough traders found for token {token_address}")
+    return token_address
 
 if __name__ == "__main__":
     dprint("Starting trader-extractor-redis.py...")
@@ -302,52 +257,108 @@ if __name__ == "__main__":
 
     # initialize the SQL connection
     try:
-        sql_cursor.execute("CREATE DATABASE IF NOT EXISTS solana_tokens")
-        sql_cursor.execute("USE solana_tokens")
-        sql_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS traders (
-                wallet_address VARCHAR(44) PRIMARY KEY,
-                token_address VARCHAR(44),
-                gross_profit DECIMAL(20, 2),
-                realized_profit DECIMAL(20, 2),
-                realized_profit_percent DECIMAL(5, 2),
-                unrealized_profit DECIMAL(20, 2),
-                unrealized_profit_percent DECIMAL(5, 2),
-                win_rate DECIMAL(5, 2),
-                wins INT,
-                losses INT,
-                trade_volume DECIMAL(20, 2),
-                trades INT,
-                avg_trade_size DECIMAL(20, 2),
-                is_bot BOOLEAN      
-            )
-                    """)
-        sqldb.commit()
+        ensure_database()
+        DB.run(ensure_wallet_tables)
+        DB.run(ensure_leaderboard_table)
+        # one-off: carry the old one-row-per-wallet `traders` table over
+        if DB.run(lambda cur: table_exists(cur, "traders")):
+            migrated = DB.run(migrate_traders)
+            dprint(f"Migrated {migrated} rows from traders (kept as traders_legacy)")
     except mysql.connector.Error as err:
         dprint(f"Error initializing MySQL: {err}")
         exit(1)
 
-    # get initial sync
-    snapshot = load_current_snapshot()
-    if snapshot:
-        for tok in snapshot:
-            _process_one_token(tok['contract'])
-    dprint("Initial sync complete")
-
-    # Subscribe to Redis channel for token changes
-    p = r.pubsub(ignore_subscribe_messages=True)
-    p.subscribe("token_changed")
-
-    for message in p.listen():
-        # Parse the 'data' field if it exists
-        if 'data' in message:
+    BROWSER_POOL.warm()
+
+    # stop dispatching on SIGTERM/SIGINT, then drain what is already queued
+    stop_event = threading.Event()
+    def _request_stop(signum, frame):
+        dprint(f"Received signal {signum}, draining workers...")
+        stop_event.set()
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    events = StreamConsumer(r, EVENT_GROUP)
+    new_group = events.ensure_group()
+
+    # events for a contract whose run was already queued/running wait here and
+    # are acked with that run's event once it succeeds
+    held: Dict[str, Dict[str, Optional[str]]] = {}   # contract -> {msg_id: event_id}
+    held_lock = threading.Lock()
+
+    def handle(item):
+        msg_id, event = item
+        contract = event["contract"]
+        try:
+            _process_one_token(contract)
+        except Exception:
+            # leave this entry (and the held ones) pending; XAUTOCLAIM hands them
+            # out again after EVENT_CLAIM_IDLE_MS
+            with held_lock:
+                held.pop(contract, None)
+            raise
+        with held_lock:
+            waiting = held.pop(contract, {})
+        if msg_id:
+            waiting[msg_id] = event.get("event_id")
+        for held_id, event_id in waiting.items():
+            events.ack(held_id, event_id)
+
+    workers = WorkerPool(
+        handle,
+        workers=WORKERS,
+        queue_size=QUEUE_SIZE,
+        name="trader",
+        on_error=lambda item, e: dprint(f"Worker failed on {item[1].get('contract')}: {e}"),
+    )
+    dprint(f"Started {WORKERS} trader workers (queue size {QUEUE_SIZE}), consumer {events.consumer}")
+
+    def dispatch(msg_id, event: Dict):
+        # waits while the queue is full, but keeps checking for shutdown
+        while not stop_event.is_set():
             try:
-                parsed_data = json.loads(message['data'])
-                if 'contract' in parsed_data:
-                    _process_one_token(parsed_data['contract'])
-                else:
-                    dprint("Warning: 'contract' key missing in parsed data")
-            except json.JSONDecodeError as e:
-                dprint(f"Error decoding JSON: {e}")
-        else:
-            dprint("Warning: 'data' field missing in message")
\ No newline at end of file
+                with held_lock:
+                    if not workers.submit((msg_id, event), key=event["contract"], timeout=0) and msg_id:
+                        # same contract already queued/running; acked when that run succeeds.
+                        # (If that run finished in between, the entry stays pending and
+                        # XAUTOCLAIM redelivers it.)
+                        held.setdefault(event["contract"], {})[msg_id] = event.get("event_id")
+                return
+            except queue.Full:
+                stop_event.wait(0.2)
+
+    # Full snapshot walk only when the group is new; afterwards the group's
+    # position in the stream (plus pending entries) says where to resume
+    if new_group:
+        snapshot = load_current_snapshot(stop=stop_event)
+        for tok in snapshot or []:
+            if stop_event.is_set():
+                break
+            dispatch(None, {"contract": tok['contract']})
+        dprint("Initial sync queued")
+    else:
+        dprint(f"Resuming consumer group '{EVENT_GROUP}' ({events.pending_count()} pending)")
+
+    while not stop_event.is_set():
+        try:
+            entries = events.read(count=10, block_ms=1000)
+        except redis.RedisError as e:
+            dprint(f"Error reading token_changed stream: {e}")
+            stop_event.wait(1.0)
+            continue
+        for msg_id, event in entries:
+            if 'contract' not in event:
+                dprint(f"Warning: 'contract' key missing in event {msg_id}")
+                events.ack(msg_id)
+            elif events.is_processed(event.get("event_id")):
+                dprint(f"Skipping already processed event {event.get('event_id')}")
+                events.ack(msg_id)
+            else:
+                dispatch(msg_id, event)
+        if entries:
+            dprint(f"Workers: {workers.stats()} | Browser pool: {BROWSER_POOL.stats()}")
+
+    workers.drain()
+    TRADER_SINK.close()
+    BROWSER_POOL.close()
+    dprint("Trader extractor stopped.")
\ No newline at end of file
@@ -0,0 +1,80 @@
+# trending_diff.py
+# Incremental ADDED / REMOVED / MOVED detection for the trending window.
+from typing import Dict, List, Optional, Tuple
+
+Key = Tuple[str, str]  # (chain, contract)
+
+class DiffEngine:
+    """
+    Keeps the published window membership in memory and updates it from each
+    scrape in O(rows), instead of rebuilding both windows every cycle.
+
+    Hysteresis so tokens sitting on the boundary don't flap:
+      - a token is ADDED when it ranks within `window_size`;
+      - a member stays in while it ranks within `window_size + exit_margin`
+        (the scrape should include those extra rows) and is REMOVED only after
+        it has been missing from them for `exit_cycles` consecutive cycles.
+    MOVED compares against the rank last *published* for the token, so a slow
+    drift fires once the threshold is crossed instead of never (or every cycle).
+    """
+
+    def __init__(self, window_size: int, rank_move_threshold: int,
+                 exit_margin: int = 0, exit_cycles: int = 1):
+        self.window_size = window_size
+        self.rank_move_threshold = rank_move_threshold
+        self.exit_margin = max(0, exit_margin)
+        self.exit_cycles = max(1, exit_cycles)
+        self.published: Dict[Key, int] = {}   # rank at last ADDED/MOVED
+        self.last_seen: Dict[Key, int] = {}
+        self.missing: Dict[Key, int] = {}     # consecutive cycles out of band
+        self.seeded = False
+
+    def seed(self, window: List[Dict]):
+        """Start from a previously saved window (e.g. after a restart)."""
+        for t in window:
+            if t["rank"] <= self.window_size:
+                key = (t["chain"], t["contract"])
+                self.published[key] = t["rank"]
+                self.last_seen[key] = t["rank"]
+        self.seeded = True
+
+    def update(self, rows: List[Dict], exit_margin: Optional[int] = None):
+        """
+        Apply one scrape (ranked rows, possibly beyond window_size).
+        `exit_margin` overrides the configured margin for this scrape, e.g.
+        when the source returned fewer rows than window + margin; members
+        below the band then rely on `exit_cycles` alone.
+        """
+        window_size = self.window_size
+        margin = self.exit_margin if exit_margin is None else max(0, exit_margin)
+        band = window_size + margin
+        curr: Dict[Key, int] = {}
+        for t in rows:
+            key = (t["chain"], t["contract"])
+            if t["rank"] <= band and key not in curr:
+                curr[key] = t["rank"]
+
+        added, removed, moved = [], [], []
+        for key, rank in curr.items():
+            if key in self.published:
+                self.missing.pop(key, None)
+                self.last_seen[key] = rank
+                old = self.published[key]
+                if abs(old - rank) >= self.rank_move_threshold:
+                    moved.append((key, old, rank))
+                    self.published[key] = rank
+            elif rank <= window_size:
+                added.append((key, rank))
+                self.published[key] = rank
+                self.last_seen[key] = rank
+
+        for key in [k for k in self.published if k not in curr]:
+            self.missing[key] = self.missing.get(key, 0) + 1
+            if self.missing[key] >= self.exit_cycles:
+                removed.append((key, self.last_seen.get(key, self.published[key])))
+                del self.published[key]
+                self.last_seen.pop(key, None)
+                self.missing.pop(key, None)
+
+        self.seeded = True
+        return added, removed, moved
@@ -0,0 +1,63 @@
+# wallet_cache.py
+# Redis-backed cache of parsed dexcheck wallet stats so wallets that show up in
+# the top traders of many tokens are not re-scraped on every event.
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+# entries younger than TTL are "fresh" (no browser visit); older ones up to
+# TTL + MAX_STALE are "stale" (re-scraped, but served if the scrape fails)
+WALLET_CACHE_TTL = int(os.getenv("WALLET_CACHE_TTL", "21600"))          # 6h
+WALLET_CACHE_MAX_STALE = int(os.getenv("WALLET_CACHE_MAX_STALE", "86400"))  # +24h
+K_WALLET = "wallet:stats:{wallet}"       # json {"cached_at": ts, "stats": {...}}
+
+class WalletCache:
+    def __init__(self, r, ttl: int = WALLET_CACHE_TTL, max_stale: int = WALLET_CACHE_MAX_STALE):
+        self.r = r
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._counts = {"hit": 0, "stale": 0, "miss": 0}
+
+    def _count(self, state: str):
+        with self._lock:
+            self._counts[state] += 1
+
+    def lookup(self, wallet: str) -> Tuple[Optional[Dict], str]:
+        """Return (stats, state) where state is 'fresh', 'stale' or 'miss'."""
+        if self.ttl <= 0:
+            self._count("miss")
+            return None, "miss"
+        raw = self.r.get(K_WALLET.format(wallet=wallet))
+        if not raw:
+            self._count("miss")
+            return None, "miss"
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            self._count("miss")
+            return None, "miss"
+        age = time.time() - entry.get("cached_at", 0)
+        if age < self.ttl:
+            self._count("hit")
+            return entry["stats"], "fresh"
+        self._count("stale")
+        return entry["stats"], "stale"
+
+    def put(self, wallet: str, stats: Dict):
+        if self.ttl <= 0:
+            return
+        entry = {"cached_at": time.time(), "stats": stats}
+        self.r.set(K_WALLET.format(wallet=wallet), json.dumps(entry), ex=self.ttl + self.max_stale)
+
+    def invalidate(self, wallet: str):
+        self.r.delete(K_WALLET.format(wallet=wallet))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = sum(counts.values())
+        counts["hit_ratio"] = round(counts["hit"] / lookups, 3) if lookups else 0.0
+        return counts
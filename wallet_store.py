@@ -0,0 +1,142 @@
+# wallet_store.py
+# Wallet stats persistence: latest stats per wallet in `wallets`, plus a
+# change-only history in `wallet_observations`: a row is added when the
+# stats hash differs from the wallet's latest observation on that token
+# (tables in schema.py).
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STATS_FIELDS = ("gross_profit", "realized_profit", "realized_profit_percent", "unrealized_profit",
+                "unrealized_profit_percent", "win_rate", "wins", "losses", "trade_volume", "trades",
+                "avg_trade_size", "is_bot")
+
+_COLS = ", ".join(STATS_FIELDS)
+_VALS = ", ".join(["%s"] * len(STATS_FIELDS))
+
+# stats_changed_at is assigned before stats_hash: MySQL evaluates the
+# assignments left to right, so it still compares against the old hash
+UPSERT_WALLETS_SQL = f"""
+    INSERT INTO wallets (wallet_address, stats_hash, {_COLS})
+    VALUES (%s, %s, {_VALS})
+    ON DUPLICATE KEY UPDATE
+        last_seen=CURRENT_TIMESTAMP,
+        stats_changed_at=IF(stats_hash = VALUES(stats_hash), stats_changed_at, CURRENT_TIMESTAMP),
+        stats_hash=VALUES(stats_hash),
+        {", ".join(f"{f}=VALUES({f})" for f in STATS_FIELDS)}
+"""
+
+INSERT_OBSERVATIONS_SQL = f"""
+    INSERT INTO wallet_observations (wallet_address, token_address, stats_hash, {_COLS})
+    VALUES (%s, %s, %s, {_VALS})
+"""
+
+# latest observation's hash per (wallet, token); {pairs} is "(%s, %s), ..."
+LATEST_HASHES_SQL = """
+    SELECT o.wallet_address, o.token_address, o.stats_hash
+    FROM wallet_observations o
+    JOIN (SELECT MAX(id) AS id FROM wallet_observations
+          WHERE (wallet_address, token_address) IN ({pairs})
+          GROUP BY wallet_address, token_address) latest ON latest.id = o.id
+"""
+
+INT_FIELDS = {"wins", "losses", "trades", "is_bot"}
+
+def _canon(field: str, v) -> str:
+    # floats/bools from the scraper and DECIMALs/ints from MySQL must hash the same
+    if v is None:
+        return ""
+    try:
+        return str(int(v)) if field in INT_FIELDS else f"{float(v):.2f}"
+    except (TypeError, ValueError):
+        return str(v)
+
+def stats_hash(stats: Dict) -> str:
+    return hashlib.sha1("|".join(_canon(f, stats.get(f)) for f in STATS_FIELDS).encode()).hexdigest()
+
+def observation_row(wallet_address: str, token_address: str, stats: Dict) -> tuple:
+    """(wallet, token, stats_hash, *STATS_FIELDS): the record queued for `write_observations`."""
+    return (wallet_address, token_address, stats_hash(stats)) + tuple(stats.get(f) for f in STATS_FIELDS)
+
+def latest_hashes(cursor, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+    """stats_hash of the newest observation of each (wallet, token) pair that has one."""
+    if not pairs:
+        return {}
+    sql = LATEST_HASHES_SQL.format(pairs=", ".join(["(%s, %s)"] * len(pairs)))
+    cursor.execute(sql, [v for pair in pairs for v in pair])
+    return {(wallet, token): h for wallet, token, h in cursor.fetchall()}
+
+def write_observations(cursor, rows: List[tuple]):
+    """
+    Upsert each wallet's latest stats and insert the observations whose
+    stats differ from the pair's previous observation (stored, or earlier
+    in `rows`), so A -> B -> A is kept as three rows.
+    """
+    latest = {}
+    for row in rows:
+        latest[row[0]] = row
+    cursor.executemany(UPSERT_WALLETS_SQL, [(row[0],) + row[2:] for row in latest.values()])
+
+    previous = latest_hashes(cursor, list({(row[0], row[1]) for row in rows}))
+    changed = []
+    for row in rows:
+        pair = (row[0], row[1])
+        if previous.get(pair) != row[2]:
+            changed.append(row)
+            previous[pair] = row[2]
+    if changed:
+        cursor.executemany(INSERT_OBSERVATIONS_SQL, changed)
+
+def migrate_traders(cursor, legacy_table: str = "traders", batch: int = 1000) -> int:
+    """
+    Copy rows of the old one-row-per-wallet `traders` table into wallets /
+    wallet_observations, then rename it to `<table>_legacy` so this runs once.
+    """
+    cursor.execute(f"SELECT wallet_address, token_address, {_COLS} FROM {legacy_table}")
+    rows = []
+    for record in cursor.fetchall():
+        stats = dict(zip(STATS_FIELDS, record[2:]))
+        rows.append(observation_row(record[0], record[1] or "", stats))
+    for i in range(0, len(rows), batch):
+        write_observations(cursor, rows[i:i + batch])
+    cursor.execute(f"RENAME TABLE {legacy_table} TO {legacy_table}_legacy")
+    return len(rows)
+
+TOP_WALLETS_SQL = """
+    SELECT w.wallet_address, {cols}, w.last_seen,
+           (SELECT COUNT(DISTINCT o.token_address) FROM wallet_observations o
+            WHERE o.wallet_address = w.wallet_address) AS tokens
+    FROM wallets w
+    WHERE w.is_bot = %s AND w.trades >= %s
+    ORDER BY w.{metric} DESC
+    LIMIT %s
+"""
+
+TOP_METRICS = ("win_rate", "gross_profit")   # the indexed (is_bot, metric) orderings
+
+def top_wallets(db, metric: str = "win_rate", limit: int = 50, min_trades: int = 0,
+                bots: bool = False) -> List[Dict]:
+    """Best wallets by `metric` with the number of distinct tokens each was seen on."""
+    if metric not in TOP_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(TOP_METRICS)}")
+    sql = TOP_WALLETS_SQL.format(cols=", ".join(f"w.{f}" for f in STATS_FIELDS), metric=metric)
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, (bots, min_trades, limit))
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+def wallet_history(db, wallet_address: str, token_address: Optional[str] = None) -> List[Dict]:
+    """Observations of one wallet (optionally on one token), oldest first."""
+    sql = f"SELECT token_address, observed_at, {_COLS} FROM wallet_observations WHERE wallet_address = %s"
+    params: Iterable = (wallet_address,)
+    if token_address:
+        sql += " AND token_address = %s"
+        params = (wallet_address, token_address)
+    sql += " ORDER BY observed_at, id"
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
@@ -0,0 +1,88 @@
+# worker_pool.py
+# Bounded queue + N worker threads with in-flight de-duplication and graceful drain.
+import queue
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_STOP = object()
+
+class WorkerPool:
+    """
+    `submit()` blocks when the queue is full (backpressure on the dispatcher).
+    A key already queued or running is not queued again. `drain()` lets the
+    workers finish everything already queued and then joins them.
+    """
+
+    def __init__(self, handler: Callable[[Any], Any], workers: int = 1,
+                 queue_size: int = 100, name: str = "worker",
+                 on_error: Optional[Callable[[Any, Exception], None]] = None):
+        self.handler = handler
+        self.on_error = on_error
+        self._q: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._processed = 0
+        self._failed = 0
+        self._skipped = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, item: Any, key: Optional[Hashable] = None, timeout: Optional[float] = None) -> bool:
+        """Queue `item`; returns False if an equal key is already pending."""
+        key = item if key is None else key
+        with self._lock:
+            if key in self._pending:
+                self._skipped += 1
+                return False
+            self._pending.add(key)
+        try:
+            self._q.put((key, item), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(key)
+            raise
+        return True
+
+    def _run(self):
+        while True:
+            entry = self._q.get()
+            try:
+                if entry is _STOP:
+                    return
+                key, item = entry
+                try:
+                    self.handler(item)
+                    with self._lock:
+                        self._processed += 1
+                except Exception as e:
+                    with self._lock:
+                        self._failed += 1
+                    if self.on_error:
+                        self.on_error(item, e)
+                finally:
+                    with self._lock:
+                        self._pending.discard(key)
+            finally:
+                self._q.task_done()
+
+    def drain(self, timeout: Optional[float] = None):
+        """Finish queued work, then stop the workers."""
+        for _ in self._threads:
+            self._q.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "queued": self._q.qsize(),
+                "pending": len(self._pending),
+                "processed": self._processed,
+                "failed": self._failed,
+                "skipped_duplicates": self._skipped,
+            }
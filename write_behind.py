@@ -0,0 +1,116 @@
+# write_behind.py
+# In-memory write-behind buffer: producers enqueue records and return at once,
+# a background thread hands them to `flush_fn` in batches.
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+_STOP = object()
+
+class WriteBehindBuffer:
+    """
+    Flushes when `batch_size` records are buffered or `flush_interval` seconds
+    after the first record of a batch, whichever comes first. At most
+    `max_pending` records wait in memory; `put()` blocks beyond that
+    (backpressure). A flush failing with one of `transient_errors` (the sink
+    is unreachable) is retried `retries` times with backoff before the batch
+    is dropped; any other error means records were rejected, so the batch is
+    bisected and only the records that fail on their own are dropped.
+    `close()` flushes everything still queued.
+    """
+
+    def __init__(self, flush_fn: Callable[[List[Any]], None], name: str = "write-behind",
+                 batch_size: int = 50, flush_interval: float = 2.0, max_pending: int = 1000,
+                 retries: int = 3, log: Optional[Callable[[str], None]] = None,
+                 transient_errors: Tuple[Type[BaseException], ...] = (OSError,)):
+        self.flush_fn = flush_fn
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.transient_errors = transient_errors
+        self.log = log or (lambda msg: None)
+        self._q: "queue.Queue" = queue.Queue(maxsize=max(1, max_pending))
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"flushed": 0, "batches": 0, "dropped": 0, "failed_flushes": 0,
+                       "last_flush_ms": 0.0, "blocked_puts": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, record: Any, timeout: Optional[float] = None):
+        if self._closed:
+            raise RuntimeError("write-behind buffer is closed")
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._stats["blocked_puts"] += 1
+            self._q.put(record, timeout=timeout)
+
+    def _flush(self, batch: List[Any]):
+        start = time.perf_counter()
+        dropped = self._write(batch)
+        with self._lock:
+            self._stats["flushed"] += len(batch) - dropped
+            self._stats["batches"] += 1
+            self._stats["dropped"] += dropped
+            self._stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _write(self, batch: List[Any]) -> int:
+        """Hand `batch` to flush_fn; returns how many of its records were dropped."""
+        for attempt in range(self.retries + 1):
+            try:
+                self.flush_fn(batch)
+                return 0
+            except Exception as e:
+                with self._lock:
+                    self._stats["failed_flushes"] += 1
+                if not isinstance(e, self.transient_errors):
+                    # the data was rejected, not the connection: split the
+                    # batch until only the offending records are left out
+                    if len(batch) == 1:
+                        self.log(f"Dropped a record the sink rejected: {e}")
+                        return 1
+                    mid = len(batch) // 2
+                    return self._write(batch[:mid]) + self._write(batch[mid:])
+                self.log(f"Flush of {len(batch)} records failed (attempt {attempt + 1}): {e}")
+                if attempt < self.retries:
+                    time.sleep(min(2 ** attempt, 30))
+        self.log(f"Dropped {len(batch)} records after {self.retries + 1} failed flushes")
+        return len(batch)
+
+    def _run(self):
+        batch: List[Any] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                if batch:
+                    self._flush(batch)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def close(self, timeout: Optional[float] = None):
+        """Flush everything queued so far and stop the flusher thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._q.qsize()
+        return stats